@@ -1,13 +1,16 @@
 import os
-import json
 from pathlib import Path
 
+try:
+    import orjson as _json
+except ImportError:
+    import json as _json
+
 # -----------------------------
 # Load json safely
 # -----------------------------
 def load_json(path):
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return _json.loads(Path(path).read_bytes())
 
 # -----------------------------
 # Detect category of model key
@@ -17,6 +20,21 @@ def is_sym(k):   return k.startswith("MIP_symmetry")
 def is_impl(k):  return k.startswith("MIP_implied")
 def is_opt(k):   return k.startswith("MIP_opt")
 
+# -----------------------------
+# Table cells (missing key → NA)
+# -----------------------------
+def time_na_cell(data, k):
+    t = data[k].get("time", None) if k in data else None
+    return "NA" if t is None or int(t) == 300 else str(int(t))
+
+def raw_time_cell(data, k):
+    t = data[k].get("time", None) if k in data else None
+    return "NA" if t is None else str(int(t))
+
+def obj_cell(data, k):
+    obj = data[k].get("obj", None) if k in data else None
+    return "NA" if obj is None else str(obj)
+
 # -----------------------------
 # Extract numeric N from filename
 # (safe version)
@@ -39,10 +57,15 @@ def main():
     if not json_files:
         raise RuntimeError("No JSON files found in res/MIP")
 
+    # ------------------------------------------------------
+    # Load every file once, keyed by N
+    # ------------------------------------------------------
+    cache = {extract_n(jf): load_json(input_dir / jf) for jf in json_files}
+
     # ------------------------------------------------------
     # Detect canonical column order FROM FIRST FILE
     # ------------------------------------------------------
-    sample_data = load_json(input_dir / json_files[0])
+    sample_data = cache[extract_n(json_files[0])]
 
     decision_cols = sorted(
         k for k in sample_data.keys()
@@ -65,65 +88,21 @@ def main():
     # ------------------------------------------------------
     # PROCESS EACH JSON FILE
     # ------------------------------------------------------
-    for jf in json_files:
-        N = extract_n(jf)
-        data = load_json(input_dir / jf)
-
-        # ---------------- TABLE 1 ----------------
-        row1 = [str(N)]
-        for k in decision_cols:
-            if k not in data:
-                row1.append("NA")
-            else:
-                t = data[k].get("time", None)
-                if t is None or int(t) == 300:
-                    row1.append("NA")
-                else:
-                    row1.append(str(int(t)))
-        table1.append(row1)
-
-        # ---------------- TABLE 2 ----------------
-        row2 = [str(N)]
-        for k in opt_cols:
-            if k not in data:
-                row2.append("NA")
-            else:
-                obj = data[k].get("obj", None)
-                row2.append("NA" if obj is None else str(obj))
-        table2.append(row2)
-
-        # ---------------- TABLE 3 ----------------
-        row3 = [str(N)]
-        for k in decision_cols:
-            if k not in data:
-                row3.append("NA")
-            else:
-                t = data[k].get("time", None)
-                row3.append("NA" if t is None else str(int(t)))
-        table3.append(row3)
-
-        # ---------------- TABLE 4 ----------------
-        row4 = [str(N)]
-        for k in opt_cols:
-            if k not in data:
-                row4.append("NA")
-            else:
-                obj = data[k].get("obj", None)
-                row4.append("NA" if obj is None else str(obj))
-        table4.append(row4)
+    for N, data in cache.items():
+
+        table1.append([str(N)] + [time_na_cell(data, k) for k in decision_cols])
+        table2.append([str(N)] + [obj_cell(data, k) for k in opt_cols])
+        table3.append([str(N)] + [raw_time_cell(data, k) for k in decision_cols])
+        table4.append([str(N)] + [obj_cell(data, k) for k in opt_cols])
 
     # ------------------------------------------------------
     # BUILD MARKDOWN
     # ------------------------------------------------------
     def make_table(title, rows, header):
-        out = []
-        out.append(f"## {title}\n")
-        out.append("| " + " | ".join(header) + " |")
-        out.append("|" + " --- |" * len(header))
-        for r in rows:
-            out.append("| " + " | ".join(r) + " |")
-        out.append("")
-        return "\n".join(out)
+        row_fmt = "| " + " | ".join(["{}"] * len(header)) + " |\n"
+        out = [f"## {title}\n\n", row_fmt.format(*header), "|" + " --- |" * len(header) + "\n"]
+        out.extend(row_fmt.format(*r) for r in rows)
+        return "".join(out)
 
     header1 = ["N"] + decision_cols
     header2 = ["N"] + opt_cols
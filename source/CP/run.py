@@ -2,7 +2,10 @@
 import json
 import argparse
 import contextlib
+import hashlib
 import io
+import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import timedelta
 import time
@@ -26,6 +29,10 @@ parser.add_argument("--ss", type=int, choices=[0, 1], default=None,
                     help="restrict to search strategy off/on (0/1)")
 parser.add_argument("--models", type=str, default="",
                     help="comma-separated exact model keys to run (override other filters)")
+parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                    help="number of MiniZinc runs executed in parallel")
+parser.add_argument("--no-cache", action="store_true",
+                    help="ignore cached results and re-run every solver")
 
 args = parser.parse_args()
 
@@ -33,6 +40,7 @@ BASE_DIR = Path(__file__).resolve().parent
 ROOT = BASE_DIR.parent.parent 
 OUTPUT_DIR = ROOT / "res" / "CP"
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+CACHE_DIR = OUTPUT_DIR / ".cache"
 
 # Default N list
 ALL_N = [6, 8, 10, 12, 14, 16, 18, 20]
@@ -107,9 +115,67 @@ def seconds_from_stats(stats) -> int:
         return TIME_LIMIT
 
 
-def run_model(model_file: str, solver_name: str, n: int, ss, sb: int, opt: bool):
-    model = minizinc.Model(model_file)
-    solver = minizinc.Solver.lookup(solver_name)
+def cache_path(cfg: dict, n: int) -> Path:
+    """
+    Cache entry for one run, keyed by the model file contents, the pairing
+    generator that fills the instance data and every option that changes the
+    result, so editing a .mzn only invalidates its own runs.
+    """
+    h = hashlib.blake2b(Path(cfg["model"]).read_bytes())
+    h.update((BASE_DIR / "round_robin.py").read_bytes())
+    h.update(f"|{cfg['solver']}|{n}|{cfg['use_ss']}|{cfg['use_sb']}|{cfg['opt']}|{TIME_LIMIT}".encode())
+    return CACHE_DIR / f"{h.hexdigest()}.json"
+
+
+def run_model(model_name: str, cfg: dict, n: int):
+    """
+    Solve one (model, n) configuration, reusing a cached result when available.
+    Returns (model_name, time, status, payload) and never touches the results
+    JSON files, so it can be dispatched to a worker pool.
+    """
+    cached = cache_path(cfg, n)
+    if not args.no_cache and cached.exists():
+        entry = json.loads(cached.read_text(encoding="utf-8"))
+        return model_name, entry["time"], entry["status"], entry["payload"]
+
+    t, st, payload = solve_model(cfg, n)
+
+    # only conclusive runs: a timeout (or a non-optimal incumbent) may well
+    # finish on the next run, and TIME_LIMIT in the key would pin it forever
+    if st == "timeout" or (st == "sat" and cfg["opt"] and not payload["optimal"]):
+        return model_name, t, st, payload
+
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = cached.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"time": t, "status": st, "payload": payload}), encoding="utf-8")
+    tmp.replace(cached)
+
+    return model_name, t, st, payload
+
+
+# Loaded once per model file / solver name and shared by every run; Instance
+# copies what it needs from the Model, so sharing it across threads is safe.
+_model_cache: dict = {}
+_solver_cache: dict = {}
+
+
+def get_model(path: str) -> minizinc.Model:
+    model = _model_cache.get(path)
+    if model is None:
+        model = _model_cache[path] = minizinc.Model(path)
+    return model
+
+
+def get_solver(name: str) -> minizinc.Solver:
+    solver = _solver_cache.get(name)
+    if solver is None:
+        solver = _solver_cache[name] = minizinc.Solver.lookup(name)
+    return solver
+
+
+def solve_model(cfg: dict, n: int):
+    model = get_model(cfg["model"])
+    solver = get_solver(cfg["solver"])
     inst = minizinc.Instance(solver, model)
 
     inst["n"] = n
@@ -123,11 +189,12 @@ def run_model(model_file: str, solver_name: str, n: int, ss, sb: int, opt: bool)
 
 
     # toggles
-    inst["use_ss"] = ss[0]
-    inst["use_sb"] = sb
+    inst["use_ss"] = cfg["use_ss"][0]
+    inst["use_sb"] = cfg["use_sb"]
 
-    with contextlib.redirect_stderr(io.StringIO()):
-        result = inst.solve(timeout=timedelta(seconds=TIME_LIMIT))
+    # Keep each solver single-threaded so parallel runs don't oversubscribe the CPUs
+    solve_kwargs = {"processes": 1} if "-p" in solver.stdFlags else {}
+    result = inst.solve(timeout=timedelta(seconds=TIME_LIMIT), **solve_kwargs)
 
     t = seconds_from_stats(result.statistics)
     t_total = t + rr_time
@@ -139,13 +206,16 @@ def run_model(model_file: str, solver_name: str, n: int, ss, sb: int, opt: bool)
             return t_total, "unsat", dict(UNSAT_TEMPLATE)
         return TIME_LIMIT, "timeout", dict(UNSAT_TEMPLATE)
 
+    # Both models print their output item as JSON
     out_str = result.solution._output_item
-    output_item = eval(out_str)
+    output_item = json.loads(out_str)
 
-    if opt:
+    if cfg["opt"]:
         sol = output_item.get("sol", [])
         obj = output_item.get("obj", None)
-        optimal_flag = output_item.get("optimal", True)
+        # the output item always prints true; only the solver status knows
+        # whether the search finished or stopped at the time limit
+        optimal_flag = output_item.get("optimal", True) and result.status == minizinc.Status.OPTIMAL_SOLUTION
     else:
         sol = output_item
         obj = None
@@ -230,28 +300,26 @@ def main():
         print("No models selected (filters removed everything).")
         return
 
-    for n in N_VALUES:
-        json_path = OUTPUT_DIR / f"{n}.json"
-        existing = load_existing(json_path)
-
-        print(f"\n=== CP n={n} ===")
-
-        for model_name, model_data in model_names.items():
-            t, st, payload = run_model(
-                model_data["model"],
-                model_data["solver"],
-                n,
-                model_data["use_ss"],
-                model_data["use_sb"],
-                model_data["opt"],
-            )
+    work = [(model_name, model_data, n) for n in N_VALUES for model_name, model_data in model_names.items()]
+    remaining = {n: len(model_names) for n in N_VALUES}
+    results = {}
 
-            existing[model_name] = payload
-            save_json(json_path, existing)
+    # MiniZinc warnings are silenced for the whole sweep: redirect_stderr swaps the
+    # process-wide sys.stderr, so it cannot be entered per task from several threads.
+    with contextlib.redirect_stderr(io.StringIO()), ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        for (_, _, n), (model_name, t, st, payload) in zip(work, executor.map(lambda item: run_model(*item), work)):
+            if n not in results:
+                results[n] = load_existing(OUTPUT_DIR / f"{n}.json")
+                print(f"\n=== CP n={n} ===")
 
+            results[n][model_name] = payload
             print(f"[{model_name}] status={st} time={t:.3f}s")
 
-        print(f"Wrote results to {json_path}")
+            remaining[n] -= 1
+            if remaining[n] == 0:
+                json_path = OUTPUT_DIR / f"{n}.json"
+                save_json(json_path, results.pop(n))
+                print(f"Wrote results to {json_path}")
 
 
 if __name__ == "__main__":
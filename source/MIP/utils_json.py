@@ -1,14 +1,18 @@
-import json
 import math
+import sys
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from common.io_json import save_results
+
+
 def write_result_json(path, approach_name=None, runtime=None, optimal=None, obj=None, sol_matrix=None, full_data=None):
    
     Path(path).parent.mkdir(parents=True, exist_ok=True)
 
     if full_data is not None:
-        with open(path, "w") as f:
-            json.dump(full_data, f, indent=2)
+        save_results(path, full_data)
         print(f"JSON written to: {path}")
         return
     data = {
@@ -19,7 +23,6 @@ def write_result_json(path, approach_name=None, runtime=None, optimal=None, obj=
             "sol": sol_matrix
         }
     }
-    with open(path, "w") as f:
-        json.dump(data, f, indent=2)
+    save_results(path, data)
 
     print(f"JSON written to: {path}")
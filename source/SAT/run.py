@@ -4,13 +4,18 @@ Run SAT approach (Glucose) for STS.
 """
 
 import argparse
+import hashlib
+import os
+import shutil
 import subprocess
 import json
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import sat_dimacs
 import sat_decode
+import totalizer
 
 GLUCOSE = "glucose"
 TIMEOUT = 300
@@ -23,6 +28,11 @@ OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 DIMACS_DIR = OUTPUT_DIR / "dimacs"
 DIMACS_DIR.mkdir(parents=True, exist_ok=True)
 
+# Content-addressed caches: CNFs keyed by encoder source + options,
+# solver runs keyed by the CNF bytes.
+CNF_CACHE_DIR = DIMACS_DIR / ".cache"
+RUN_CACHE_DIR = OUTPUT_DIR / ".cache"
+
 
 def load_json(path: Path):
     if not path.exists():
@@ -33,16 +43,32 @@ def load_json(path: Path):
         return {}
 
 
-def safe_update_json(json_path: Path, entry: dict):
-    data = load_json(json_path)
-    data.update(entry)
-    json_path.write_text(json.dumps(data, indent=2), encoding="utf-8")
+def save_json(json_path: Path, data: dict):
+    """
+    Write the whole results dict at once: dump to a temp file next to it,
+    then rename over the target so a crash never leaves a truncated JSON.
+    """
+    tmp = json_path.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(data, indent=2), encoding="utf-8")
+    tmp.replace(json_path)
 
 
 def timeout_result():
     return {"time": 300, "optimal": False, "obj": None, "sol": []}
 
 
+def cache_key(data: bytes, *options) -> str:
+    h = hashlib.blake2b(data)
+    h.update("|".join(str(o) for o in options).encode())
+    return h.hexdigest()
+
+
+def atomic_copy(src: Path, dst: Path):
+    tmp = dst.with_suffix(dst.suffix + ".tmp")
+    shutil.copyfile(src, tmp)
+    tmp.replace(dst)
+
+
 def run_glucose(cnf_path: Path):
     """
     Run Glucose on given CNF file.
@@ -66,21 +92,130 @@ def run_glucose(cnf_path: Path):
         return "timeout", ""
 
 
-def generate_dimacs(n: int, use_sym: bool):
+def solve_cnf(cnf_path: Path):
+    """
+    run_glucose with an on-disk cache keyed by the CNF contents.
+    Return (status, output, solve_time).
     """
-    Generate CNF in-process so we can keep the reverse map for decoding.
-    Writes: res/SAT/dimacs/{n}.cnf
-    Returns (cnf_path, reverse_map, pairings)
+    cached = RUN_CACHE_DIR / f"{cache_key(cnf_path.read_bytes(), GLUCOSE, TIMEOUT)}.json"
+    if not args.no_cache and cached.exists():
+        entry = json.loads(cached.read_text(encoding="utf-8"))
+        return entry["status"], entry["output"], entry["time"]
+
+    t0 = time.time()
+    status, output = run_glucose(cnf_path)
+    solve_time = time.time() - t0
+
+    # timeouts/unknown are not cached: they depend on machine load, not the CNF
+    if status not in ("sat", "unsat"):
+        return status, output, solve_time
+
+    RUN_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = cached.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"status": status, "output": output, "time": solve_time}), encoding="utf-8")
+    tmp.replace(cached)
+    return status, output, solve_time
+
+
+def approach_suffix(use_sym: bool) -> str:
     """
-    sat_dimacs.build_dimacs(n, use_sym=use_sym, anchor_week=args.anchor_week)
-    #print(f"n={n} vars={sat_dimacs.next_var-1} clauses={len(sat_dimacs.clauses)} sym={args.sym}")
+    Suffix shared by the approach key and the CNF file name, e.g. _sb_pin1w1_D1
+    """
+    suffix = "_sb" if use_sym else ""
+    if args.pin_team1 > 0:
+        suffix += f"_pin1w{args.pin_team1}"
+    if args.max_diff is not None:
+        suffix += f"_D{args.max_diff}"
+    return suffix
+
 
-    cnf_path = DIMACS_DIR / f"{n}.cnf"
+def generate_dimacs(n: int, use_sym: bool):
+    """
+    Generate CNF in-process.
+    Writes: res/SAT/dimacs/{n}{approach_suffix}.cnf,
+    unless an identical CNF is already cached.
+    Returns (cnf_path, pairings)
+    """
+    source = Path(sat_dimacs.__file__).read_bytes() + Path(totalizer.__file__).read_bytes()
+    key = cache_key(source, n, use_sym, args.anchor_week, args.max_diff, args.pin_team1)
+    cached = CNF_CACHE_DIR / f"{key}.cnf"
+    if not args.no_cache and cached.exists():
+        return cached, sat_dimacs.circle_method_pairings(n)
+
+    sat_dimacs.build_dimacs(
+        n,
+        use_sym=use_sym,
+        anchor_week=args.anchor_week,
+        max_diff=args.max_diff,
+        pin_team1_weeks=args.pin_team1,
+    )
+    #print(f"n={n} vars={sat_dimacs.current.num_vars} clauses={sat_dimacs.current.num_clauses} sym={args.sym}")
+
+    suffix = approach_suffix(use_sym)
+    cnf_path = DIMACS_DIR / f"{n}{suffix}.cnf"
     sat_dimacs.write_dimacs(str(cnf_path))
 
-    reverse_map = sat_dimacs.get_reverse_map()
+    CNF_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    atomic_copy(cnf_path, cached)
+
     pairings = sat_dimacs.get_pairings()
-    return cnf_path, reverse_map, pairings
+    return cnf_path, pairings
+
+
+def proven_optimal(results: dict, approach: str, d: int) -> bool:
+    """
+    A schedule with |home - away| <= d is optimal if d is the parity lower
+    bound (W = n - 1 is odd, so 1) or the same approach was UNSAT at d - 2.
+    """
+    if d <= 1:
+        return True
+    lower = results.get(approach.rsplit("_D", 1)[0] + f"_D{d - 2}")
+    return bool(lower) and lower["optimal"] and not lower["sol"]
+
+
+def make_result(approach: str, n: int, pairings, status: str, output: str, elapsed: float, results: dict):
+    """
+    results: the entries already recorded for this n, used to tell whether
+    a fairness run (--max-diff) is proven optimal.
+    """
+    if status == "sat":
+        print(f"[{approach}] n={n} SAT time={elapsed:.3f}s, decoding...")
+
+        assignments = sat_decode.parse_glucose_solution(output)
+        sol = sat_decode.decode_schedule(assignments, pairings, n, with_home=args.max_diff is not None)
+
+        if sol is None:
+            print(f"[{approach}] decoding failed -> marking as timeout")
+            return timeout_result()
+
+        if args.max_diff is None:
+            return {
+                "time": int(min(elapsed, TIMEOUT)),
+                "optimal": True,
+                "obj": None,
+                "sol": sol
+            }
+
+        # max_diff is only a bound: report the diff the schedule achieves
+        d = sat_decode.achieved_diff(sol, n)
+        return {
+            "time": int(min(elapsed, TIMEOUT)),
+            "optimal": proven_optimal(results, approach, d),
+            "obj": d,
+            "sol": sol
+        }
+
+    if status == "unsat":
+        print(f"[{approach}] n={n} UNSAT time={elapsed:.3f}s")
+        return {
+            "time": int(min(elapsed, TIMEOUT)),
+            "optimal": True,
+            "obj": None,
+            "sol": []
+        }
+
+    print(f"[{approach}] n={n} TIMEOUT/UNKNOWN -> marking time=300")
+    return timeout_result()
 
 
 if __name__ == "__main__":
@@ -89,6 +224,13 @@ if __name__ == "__main__":
     parser.add_argument("--sym", action="store_true", help="enable symmetry breaking")
     parser.add_argument("--anchor_week", type=int, default=0)
     parser.add_argument("--all", action="store_true", help="run both glucose and glucose_sb for all n")
+    parser.add_argument("--no-cache", action="store_true", help="ignore cached CNFs and solver runs")
+    parser.add_argument("--pin-team1", type=int, default=0,
+                        help="pin team 1 match to period 0 for first k weeks")
+    parser.add_argument("--max-diff", type=int, default=None,
+                        help="also decide home/away, with |home - away| <= max_diff for every team")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="number of glucose runs executed in parallel")
     args = parser.parse_args()
 
     if args.all or args.n == 0:
@@ -96,64 +238,40 @@ if __name__ == "__main__":
     else:
         N_VALUES = [args.n]
 
+    executor = ThreadPoolExecutor(max_workers=args.jobs)
+
     for n in N_VALUES:
         print(f"\n====== Running n = {n} ======")
         json_path = OUTPUT_DIR / f"{n}.json"
+        results = load_json(json_path)
 
         sym_values = [args.sym]
         if args.all:
             sym_values = [False, True]
 
+        # sat_dimacs keeps module-level state, so CNFs are built one at a time
+        # here; only the glucose runs are dispatched to the pool.
+        jobs = []
         for sym in sym_values:
-            approach = "glucose_sb" if sym else "glucose"
+            approach = "glucose" + approach_suffix(sym)
 
             start_all = time.time()
 
             try:
-                cnf_path, reverse_map, pairings = generate_dimacs(n, use_sym=sym)
+                cnf_path, pairings = generate_dimacs(n, use_sym=sym)
             except Exception as e:
                 print(f"[{approach}] CNF generation failed: {e}")
-                safe_update_json(json_path, {approach: timeout_result()})
+                results[approach] = timeout_result()
                 continue
 
-            status, output = run_glucose(cnf_path)
-
-            elapsed = time.time() - start_all
-
-            if status == "sat":
-                print(f"[{approach}] n={n} SAT time={elapsed:.3f}s, decoding...")
-
-                assignments = sat_decode.parse_glucose_solution(output)
-                sol = sat_decode.decode_schedule(assignments, reverse_map, pairings, n)
-
-                if sol is None:
-                    print(f"[{approach}] decoding failed -> marking as timeout")
-                    safe_update_json(json_path, {approach: timeout_result()})
-                    continue
-
-                safe_update_json(json_path, {
-                    approach: {
-                        "time": int(min(elapsed, TIMEOUT)),
-                        "optimal": True,
-                        "obj": None,
-                        "sol": sol
-                    }
-                })
-
-            elif status == "unsat":
-                print(f"[{approach}] n={n} UNSAT time={elapsed:.3f}s")
-                safe_update_json(json_path, {
-                    approach: {
-                        "time": int(min(elapsed, TIMEOUT)),
-                        "optimal": True,
-                        "obj": None,
-                        "sol": []
-                    }
-                })
+            gen_time = time.time() - start_all
+            jobs.append((approach, pairings, gen_time, executor.submit(solve_cnf, cnf_path)))
 
-            else:
-                print(f"[{approach}] n={n} TIMEOUT/UNKNOWN -> marking time=300")
-                safe_update_json(json_path, {approach: timeout_result()})
+        for approach, pairings, gen_time, future in jobs:
+            status, output, solve_time = future.result()
+            results[approach] = make_result(approach, n, pairings, status, output, gen_time + solve_time, results)
 
+        save_json(json_path, results)
 
+    executor.shutdown()
     print("\nDone.\n")
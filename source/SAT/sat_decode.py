@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
-import re
+from functools import lru_cache
+
 
 def parse_glucose_solution(output: str):
     """
@@ -19,14 +20,33 @@ def parse_glucose_solution(output: str):
     return assignments
 
 
-def decode_schedule(assignments, reverse_var, pairings, n: int):
+@lru_cache(maxsize=16)
+def build_var_table(n: int):
+    """
+    Table of the X_w_m_p variables, indexed by var_id - 1.
+
+    build_dimacs allocates the X variables first, in (w, m, p) order,
+    so entry k is the (w, m, p) triple of DIMACS variable k + 1.
+    Auxiliary variables come after them and are not in the table.
+
+    The table only depends on n, so it is cached; it is a tuple so the
+    cached value cannot be mutated by callers.
+    """
+    periods = n // 2
+    weeks = n - 1
+    matches_per_week = n // 2
+    return tuple((w, m, p) for w in range(weeks) for m in range(matches_per_week) for p in range(periods))
+
+
+def decode_schedule(assignments, pairings, n: int, with_home: bool = False):
     """
     Decode CNF model into checker format:
 
       sol[period][week] = [home, away]
 
-    reverse_var : list mapping var_id -> variable name
     pairings: output of the circle method (weeks[w][m] = (a,b))
+    with_home: the CNF has H_w_m orientation vars (allocated right after
+               the X vars, in (w, m) order); otherwise a is always home.
     """
 
     periods = n // 2
@@ -35,32 +55,20 @@ def decode_schedule(assignments, reverse_var, pairings, n: int):
 
     sol = [[None for _ in range(weeks)] for _ in range(periods)]
 
-    import re
-    pat = re.compile(r"^X_(\d+)_(\d+)_(\d+)$")
+    table = build_var_table(n)
+    n_x = len(table)
 
     for vid, val in assignments.items():
-        if not val:
-            continue
-
-        idx = vid - 1
-        if idx < 0 or idx >= len(reverse_var):
-            continue
-
-        name = reverse_var[idx]
-        m = pat.match(name)
-        if not m:
-            continue
-
-        w = int(m.group(1))
-        mi = int(m.group(2))
-        p = int(m.group(3))
-
-        if not (0 <= w < weeks and 0 <= mi < matches_per_week and 0 <= p < periods):
+        if not val or not (1 <= vid <= n_x):
             continue
 
+        w, mi, p = table[vid - 1]
         a, b = pairings[w][mi]
 
-        # fixed orientation: a is home, b is away
+        if with_home and not assignments.get(n_x + w * matches_per_week + mi + 1, False):
+            a, b = b, a
+
+        # a is home, b is away
         sol[p][w] = [a, b]
 
     # sanity check- all slots must be filled
@@ -70,3 +78,15 @@ def decode_schedule(assignments, reverse_var, pairings, n: int):
                 return None
 
     return sol
+
+
+def achieved_diff(sol, n: int) -> int:
+    """
+    max |home - away| over teams for a decoded schedule
+    """
+    home = [0] * (n + 1)
+    for row in sol:
+        for h, _a in row:
+            home[h] += 1
+    W = n - 1
+    return max(abs(2 * home[t] - W) for t in range(1, n + 1))
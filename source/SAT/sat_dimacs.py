@@ -17,113 +17,184 @@ SAT constraints enforce:
   B) each period has exactly one match per week
   C) each team appears in the same period at most twice over all weeks
 
+Optionally (max_diff given) home/away orientation is decided too:
+    H_w_m = first team of match m of week w plays at home
+  D) every team has |home - away| <= max_diff, via a totalizer per team
+
 """
 
-from itertools import combinations
+from collections import namedtuple
+from functools import lru_cache
+from itertools import combinations, product
+from math import prod
+
+from totalizer import totalizer
 
-# Global CNF state
+# Builder state, reset by build_cnf and only meaningful while it runs.
+# Clauses are appended to an in-memory bytearray as DIMACS text (no
+# temporary file); only the clause count is kept, the header is written
+# by write_dimacs.
 
-clauses = []
-var_index = {}
-reverse_var = []
+body = None
+num_clauses = 0
 next_var = 1
 
-# We also keep the precomputed pairings for decoding.
-# weeks[w] = list of matches (a,b), teams are 1..n
-weeks = []
+# Named variables are allocated in blocks of consecutive ids, so an id is
+# plain arithmetic on its indices; names are only built by get_reverse_map.
+# blocks = [(first_id, prefix, shape)]
+blocks = []
+
+# A finished CNF, immutable so it can be cached and shared:
+#   body   = DIMACS clause lines (bytes), without the header
+#   weeks  = precomputed pairings for decoding, weeks[w][m] = (a,b), teams 1..n
+#   blocks = named variable blocks, for get_reverse_map
+Cnf = namedtuple("Cnf", "num_vars num_clauses body weeks blocks")
+
+# The CNF selected by the last build_dimacs call
+current = None
 
 
-def new_var(name: str) -> int:
+def new_block(prefix: str, *shape) -> int:
+    """
+    Allocate prod(shape) consecutive ids named prefix_i_j_...;
+    index (i, j, ...) gets first + its row-major offset. Returns first.
+    """
     global next_var
-    if name in var_index:
-        return var_index[name]
-    var_index[name] = next_var
-    reverse_var.append(name)
+    first = next_var
+    blocks.append((first, prefix, shape))
+    next_var += prod(shape)
+    return first
+
+
+def new_aux() -> int:
+    """
+    Fresh anonymous auxiliary variable (encoding helper, never decoded).
+    """
+    global next_var
+    v = next_var
     next_var += 1
-    return var_index[name]
+    return v
+
+
+def reset():
+    global body, num_clauses, next_var, blocks
+    body = bytearray()
+    num_clauses = 0
+    next_var = 1
+    blocks = []
+
+
+# DIMACS text of every literal seen so far, e.g. -12 -> b"-12 ".
+# Ids only grow, so the cache is extended in chunks and never reset.
+lit_bytes = {}
+lit_bytes_max = 0
+
+
+def _grow_lit_bytes(upto: int):
+    global lit_bytes_max
+    for v in range(lit_bytes_max + 1, upto + 1):
+        s = str(v).encode()
+        lit_bytes[v] = s + b" "
+        lit_bytes[-v] = b"-" + s + b" "
+    lit_bytes_max = upto
 
 
 def add_clause(lits):
     """
     Add a CNF clause (list of ints) without trailing 0.
     """
-    clauses.append(lits)
+    global num_clauses
+    if next_var > lit_bytes_max:
+        _grow_lit_bytes(2 * next_var)
+    lb = lit_bytes
+    body.extend(b"".join([lb[l] for l in lits]))
+    body.extend(b"0\n")
+    num_clauses += 1
+
+
+# Above this size the ladder AMO is smaller than the pairwise one
+LADDER_MIN = 7
+
+
+def at_most_one_ladder(lits):
+    """
+    Sinz sequential (ladder) at-most-one:
+      s[i] = some of x0..xi is true
+    which needs len-1 aux vars and about 3*len clauses instead of len^2/2.
+    """
+    k = len(lits)
+    if k <= 1:
+        return
+    s = [new_aux() for _ in range(k - 1)]
+
+    add_clause([-lits[0], s[0]])
+    for i in range(1, k - 1):
+        add_clause([-lits[i], s[i]])
+        add_clause([-s[i - 1], s[i]])
+        add_clause([-lits[i], -s[i - 1]])
+    add_clause([-lits[k - 1], -s[k - 2]])
+
+
+def at_most_one(lits, mode="auto"):
+    """
+    CNF for at most one: pairwise (-li OR -lj), or the ladder encoding
+    (mode="ladder", or automatically for LADDER_MIN literals or more)
+    """
+    if mode == "ladder" or (mode == "auto" and len(lits) >= LADDER_MIN):
+        at_most_one_ladder(lits)
+        return
+    for a, b in combinations(lits, 2):
+        add_clause([-a, -b])
 
 
-def exactly_one(lits):
+def exactly_one(lits, mode="auto"):
     """
     CNF for exactly one:
       - at least one: (l1 OR l2 OR ... OR lk)
-      - at most one: pairwise (-li OR -lj)
-    This is fine because our sets are size <= n/2 (<=12 for n=24).
+      - at most one: see at_most_one
     """
     if not lits:
         return
     add_clause(lits[:])  # at least one
-    for i in range(len(lits)):
-        for j in range(i + 1, len(lits)):
-            add_clause([-lits[i], -lits[j]])
+    at_most_one(lits, mode)
 
-def at_most_2_seq(lits, tag):
+def at_most_k_seq(lits, k):
     """
-    CNF encoding of sum(lits) <= 2 using two sequential chains.
-    We build two sequences:
-      s[i] = among x0..xi, at least 1 is true
-      t[i] = among x0..xi, at least 2 are true
-
-    Then we dontallow a 3rd true:
-      xi & t[i-1] -> False
+    Sinz sequential counter for sum(lits) <= k:
+      r[i][j] = among x0..xi, at least j+1 are true
+    which needs (len-1)*k aux vars and O(len*k) clauses.
     """
     n = len(lits)
-    if n <= 2:
+    if n <= k:
         return
 
-    # s and t for i = 0..n-2 (we dont need them for the last position)
-    s = [None] * (n - 1)
-    t = [None] * (n - 1)
-
-    for i in range(n - 1):
-        s[i] = new_var(f"s_{tag}_{i}")
-        t[i] = new_var(f"t_{tag}_{i}")
+    r = [[new_aux() for _ in range(k)] for _ in range(n - 1)]
 
-    add_clause([-lits[0], s[0]])
-    # t0 stays unconstrained (it should be false naturally, but we don't need to force it)
+    add_clause([-lits[0], r[0][0]])
+    for j in range(1, k):
+        add_clause([-r[0][j]])
 
-    # Induction for i = 1..n-2, processing xi
     for i in range(1, n - 1):
         xi = lits[i]
+        add_clause([-xi, r[i][0]])
+        add_clause([-r[i - 1][0], r[i][0]])
+        for j in range(1, k):
+            # (xi AND j already true) -> j+1 true
+            add_clause([-xi, -r[i - 1][j - 1], r[i][j]])
+            add_clause([-r[i - 1][j], r[i][j]])
+        # forbid a (k+1)-th true
+        add_clause([-xi, -r[i - 1][k - 1]])
 
-        # xi -> s[i]
-        add_clause([-xi, s[i]])
-        # s[i-1] -> s[i]
-        add_clause([-s[i - 1], s[i]])
-
-        # (xi AND s[i-1]) -> t[i]
-        add_clause([-xi, -s[i - 1], t[i]])
-        # t[i-1] -> t[i]
-        add_clause([-t[i - 1], t[i]])
-
-        # t[i] -> s[i] (if we already have 2 trues then we definitely have 1 true)
-        add_clause([-t[i], s[i]])
-
-    # Forbid getting a 3rd true:
-    # for i = 2..n-1:  xi AND t[i-1] -> False
-    for i in range(2, n):
-        xi = lits[i]
-        add_clause([-xi, -t[i - 1]])
+    add_clause([-lits[n - 1], -r[n - 2][k - 1]])
 
 
 def at_most_2(lits):
     """
-    CNF for at most 2:
-    forbid any triple being all true:
-      for all a<b<c:  (-a OR -b OR -c)
-    Our list size is number of weeks (<=23 for n=24)
+    CNF for at most 2, via the sequential counter.
+    Our list size is number of weeks (<=23 for n=24), where forbidding
+    every triple would cost C(W,3) clauses per (team, period).
     """
-    if len(lits) <= 2:
-        return
-    for a, b, c in combinations(lits, 3):
-        add_clause([-a, -b, -c])
+    at_most_k_seq(lits, 2)
 
 
 # Round-robin pairings(circle method)
@@ -152,15 +223,39 @@ def circle_method_pairings(n: int):
 
 # DIMACS builder
 
-def build_dimacs(n: int, use_sym: bool = False, anchor_week: int = 0):
+def build_dimacs(
+    n: int,
+    use_sym: bool = False,
+    anchor_week: int = 0,
+    max_diff: int | None = None,
+    pin_team1_weeks: int = 0,
+):
     """
-    Build the DIMACS CNF using X_w_m_p variables.
+    Build (or fetch from the cache) the CNF for these options and make it
+    the one used by write_dimacs / get_pairings / get_reverse_map.
     """
-    global clauses, var_index, reverse_var, next_var, weeks
-    clauses = []
-    var_index = {}
-    reverse_var = []
-    next_var = 1
+    global current
+    current = build_cnf(n, use_sym, anchor_week, max_diff, pin_team1_weeks)
+    return current
+
+
+# A run needs at most the plain and the SB CNF of one n at a time (CNFs are
+# also cached on disk by SAT/run.py), so only those two stay in memory.
+@lru_cache(maxsize=2)
+def build_cnf(
+    n: int,
+    use_sym: bool = False,
+    anchor_week: int = 0,
+    max_diff: int | None = None,
+    pin_team1_weeks: int = 0,
+) -> Cnf:
+    """
+    Build the DIMACS CNF using X_w_m_p variables
+    (and H_w_m orientation variables when max_diff is given).
+    The module-level builder state is reset first and only used while
+    building; the result is returned as an immutable Cnf.
+    """
+    reset()
 
     if n % 2 != 0:
         raise ValueError("n must be even")
@@ -170,47 +265,49 @@ def build_dimacs(n: int, use_sym: bool = False, anchor_week: int = 0):
     W = n - 1
     P = n // 2
     M = n // 2  # matches per week
-
-    def X(w, m, p):
-        return new_var(f"X_{w}_{m}_{p}")
-    
-    for w in range(W):
-        for m in range(M):
-            for p in range(P):
-                X(w, m, p)
+    Ws, Ps, Ms = tuple(range(W)), tuple(range(P)), tuple(range(M))
+
+    # X[w][m][p] -> var id, allocated once in (w, m, p) order
+    x0 = new_block("X", W, M, P)
+    X = [[[x0 + (w * M + m) * P + p for p in Ps] for m in Ms] for w in Ws]
+
+    # H[w][m] -> var id, allocated right after X in (w, m) order
+    H = None
+    if max_diff is not None:
+        h0 = new_block("H", W, M)
+        H = [[h0 + w * M + m for m in Ms] for w in Ws]
+
+    # match_of[t][w] = index of the match team t plays in week w
+    match_of = [[None] * W for _ in range(n + 1)]
+    for w in Ws:
+        for m, (a, b) in enumerate(weeks[w]):
+            match_of[a][w] = m
+            match_of[b][w] = m
+    if any(None in match_of[t] for t in range(1, n + 1)):
+        raise RuntimeError("circle method failed unexpectedly")
 
     # 1. Each match (w,m) goes to exactly one period p
-    for w in range(W):
-        for m in range(M):
-            exactly_one([X(w, m, p) for p in range(P)])
+    for w in Ws:
+        for m in Ms:
+            exactly_one(X[w][m][:])
 
     # 2 Each period (w,p) contains exactly one match m
-    for w in range(W):
-        for p in range(P):
-            exactly_one([X(w, m, p) for m in range(M)])
+    # With M == P and every match placed by (1), at most one per period
+    # already forces exactly one, so the at-least-one side is left out.
+    for w in Ws:
+        for p in Ps:
+            at_most_one([X[w][m][p] for m in Ms])
 
     # 3) Each team appears in the same period at most twice overall
     # For each team t and period p, collect the unique match index m(t,w) in each week w
     for t in range(1, n + 1):
-        for p in range(P):
-            lits = []
-            for w in range(W):
-                # find match index in week w that includes team t
-                mtw = None
-                for m, (a, b) in enumerate(weeks[w]):
-                    if a == t or b == t:
-                        mtw = m
-                        break
-            
-                if mtw is None:
-                    raise RuntimeError("circle method failed unexpectedly")
-
-                lits.append(X(w, mtw, p))
+        mt = match_of[t]
+        for p in Ps:
+            lits = [X[w][mt[w]][p] for w in Ws]
 
             # Implied constraint    
             add_clause(lits[:])
             at_most_2(lits)
-            #at_most_2_seq(lits, tag=f"T{t}_P{p}")
 
     # Symmetry breaking:
     # We can fix the period permutation by freezing week 0:
@@ -220,18 +317,49 @@ def build_dimacs(n: int, use_sym: bool = False, anchor_week: int = 0):
         aw = anchor_week % W
         # Freeze week 0
         for m in range(M):
-            add_clause([X(aw, m, m)])
+            add_clause([X[aw][m][m]])
+
+    # Optional extra symmetry breaking (same as the SMT model):
+    # team 1 plays in period 0 during the first k weeks.
+    # k=1 only picks which period is called 0; larger k is a heuristic.
+    if pin_team1_weeks > 0:
+        for w in range(min(pin_team1_weeks, W)):
+            add_clause([X[w][match_of[1][w]][0]])
+
+    # 4) Fairness: |home(t) - away(t)| <= max_diff, i.e.
+    #    ceil((W-max_diff)/2) <= home(t) <= floor((W+max_diff)/2)
+    if H is not None:
+        # Break global flip symmetry for home bits
+        add_clause([H[0][0]])
+
+        lo, hi = (W - max_diff + 1) // 2, (W + max_diff) // 2
+        for t in range(1, n + 1):
+            mt = match_of[t]
+            home_lits = [H[w][mt[w]] if weeks[w][mt[w]][0] == t else -H[w][mt[w]] for w in Ws]
+            outs = totalizer(home_lits, new_aux, add_clause)
+            if hi < W:
+                add_clause([-outs[hi]])
+            if lo >= 1:
+                add_clause([outs[lo - 1]])
+
+    return Cnf(next_var - 1, num_clauses, bytes(body), tuple(map(tuple, weeks)), tuple(blocks))
 
 def get_reverse_map():
-    return reverse_var[:]
+    """
+    Names of all variables, indexed by var_id - 1 (aux vars are _aux_<id>).
+    """
+    names = [None] * current.num_vars
+    for first, prefix, shape in current.blocks:
+        for k, idx in enumerate(product(*(range(d) for d in shape))):
+            names[first - 1 + k] = "_".join([prefix, *map(str, idx)])
+    return [name or f"_aux_{v}" for v, name in enumerate(names, start=1)]
 
 
 def get_pairings():
 
-    return weeks
+    return current.weeks
 
 def write_dimacs(path: str):
-    with open(path, "w", encoding="utf-8") as f:
-        f.write(f"p cnf {next_var - 1} {len(clauses)}\n")
-        for cl in clauses:
-            f.write(" ".join(str(x) for x in cl) + " 0\n")
+    with open(path, "wb") as f:
+        f.write(f"p cnf {current.num_vars} {current.num_clauses}\n".encode())
+        f.write(current.body)
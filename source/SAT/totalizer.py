@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Totalizer encoding (Bailleux & Boufkhad) for cardinality constraints in CNF.
+
+totalizer(lits) builds a binary tree of unary adders over lits and returns
+the sorted outputs:
+
+    outs[i]  <->  at least i+1 of lits are true
+
+Both directions of the equivalence are encoded, so one tree serves lower
+and upper bounds alike and unit propagation is arc-consistent:
+
+    sum(lits) <= k   :  add_clause([-outs[k]])      (k < len(lits))
+    sum(lits) >= k   :  add_clause([outs[k - 1]])   (k >= 1)
+
+The encoder is independent of the clause store: new_var() must return a
+fresh variable id and add_clause(lits) must record one clause.
+"""
+
+
+def _merge(a, b, new_var, add_clause):
+    """
+    Unary addition of two sorted output lists a, b into r, len(r) = len(a) + len(b).
+    """
+    p, q = len(a), len(b)
+    r = [new_var() for _ in range(p + q)]
+
+    # indices below are counts: a_i = "at least i true in a", a_0 = True
+    for i in range(p + 1):
+        for j in range(q + 1):
+            # (a_i AND b_j) -> r_{i+j}
+            if i + j >= 1:
+                cl = [r[i + j - 1]]
+                if i:
+                    cl.append(-a[i - 1])
+                if j:
+                    cl.append(-b[j - 1])
+                add_clause(cl)
+            # (NOT a_{i+1} AND NOT b_{j+1}) -> NOT r_{i+j+1}
+            if i + j < p + q:
+                cl = [-r[i + j]]
+                if i < p:
+                    cl.append(a[i])
+                if j < q:
+                    cl.append(b[j])
+                add_clause(cl)
+    return r
+
+
+def totalizer(lits, new_var, add_clause):
+    """
+    Return the sorted outputs of a totalizer over lits (see module docstring).
+    A single literal is its own output, so no variables are spent on leaves.
+    """
+    if not lits:
+        return []
+    layer = [[x] for x in lits]
+    while len(layer) > 1:
+        nxt = [_merge(layer[i], layer[i + 1], new_var, add_clause) for i in range(0, len(layer) - 1, 2)]
+        if len(layer) % 2:
+            nxt.append(layer[-1])
+        layer = nxt
+    return layer[0]
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Run several equivalent configurations of the same instance in parallel
+processes and keep the first conclusive answer.
+
+Symmetry breaking and pinning help on some n and hurt on others, so instead
+of guessing, every variant races and the losers are terminated as soon as one
+of them reports sat/unsat.
+
+With partition=True the configurations are cubes that split the search
+space instead: a sat answer still wins at once, but unsat needs every cube.
+"""
+import multiprocessing as mp
+import os
+import queue
+import signal
+import time
+
+
+def _worker(results, fn, n, cfg):
+    # own process group, so external solvers started by fn die with the worker
+    os.setpgrp()
+    try:
+        results.put(fn(n, cfg))
+    except Exception:
+        results.put(None)
+
+
+def run_portfolio(fn, n: int, cfgs, timeout_s: int, partition: bool = False, worker_time: bool = False):
+    """
+    fn(n, cfg) -> (key, time, status, sol, obj), as SMT/run.py's run_config.
+    Returns the first sat/unsat tuple (its key names the winning variant) and
+    the wall time until it arrived; (None, timeout_s, "timeout", [], None) if
+    no variant concludes in time. For partition=True, the unsat tuple is the
+    last cube's, returned once all cubes are unsat.
+    worker_time=True returns the winner's own time instead of the wall time,
+    for callers whose fn times only the solve itself.
+    """
+    results = mp.Queue()
+    procs = [mp.Process(target=_worker, args=(results, fn, n, cfg), daemon=True) for cfg in cfgs]
+
+    t_start = time.time()
+    for p in procs:
+        p.start()
+
+    winner = None
+    pending = len(procs)
+    n_unsat = 0
+    try:
+        while pending and winner is None:
+            left = timeout_s - (time.time() - t_start)
+            if left <= 0:
+                break
+            try:
+                res = results.get(timeout=left)
+            except queue.Empty:
+                break
+            pending -= 1
+            if res is None:
+                continue
+            if partition and res[2] == "unsat":
+                n_unsat += 1
+                if n_unsat == len(procs):
+                    winner = res
+            elif res[2] in ("sat", "unsat"):
+                winner = res
+    finally:
+        for p in procs:
+            if p.is_alive():
+                try:
+                    os.killpg(p.pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    # group not created yet
+                    p.terminate()
+        for p in procs:
+            p.join()
+
+    elapsed = min(time.time() - t_start, timeout_s)
+    if winner is None:
+        return None, timeout_s, "timeout", [], None
+    key, t, st, sol, obj = winner
+    return key, (t if worker_time else elapsed), st, sol, obj
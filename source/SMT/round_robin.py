@@ -1,9 +1,16 @@
 #!/usr/bin/env python3
 """
 Round-robin pairings (circle method) for even n.
-weeks[w] = list of P matches (a,b) with a<b
+weeks[w] = tuple of P matches (a,b) with a<b
+(tuples throughout: the pairings are read-only and iterated many times)
+
+Both tables are memoized per n: the model, the fairness bounds of every
+bisection probe and the SMT-LIB exporter all ask for the same ones.
 """
+from functools import lru_cache
+
 
+@lru_cache(maxsize=None)
 def circle_method_pairs(n: int):
     if n % 2 != 0:
         raise ValueError("n must be even")
@@ -27,11 +34,30 @@ def circle_method_pairs(n: int):
                 pairs.append((a, b))
             else:
                 pairs.append((b, a))
-        weeks.append(pairs)
+        weeks.append(tuple(pairs))
 
         # rotate
         rot = [rot[-1]] + rot[:-1]
 
-    return weeks
+    return tuple(weeks)
 
 circle_method_pairings = circle_method_pairs
+
+
+@lru_cache(maxsize=None)
+def team_match_index(weeks, n: int):
+    """
+    match_of[w][t] = index m of the match team t plays in week w
+    (shared by the Z3 model and the SMT-LIB exporter). weeks must be the
+    tuple from circle_method_pairs; the table is returned as tuples.
+    """
+    match_of = [[None] * (n + 1) for _ in range(len(weeks))]
+    for w, week in enumerate(weeks):
+        for m, (a, b) in enumerate(week):
+            match_of[w][a] = m
+            match_of[w][b] = m
+    for w in range(len(weeks)):
+        for t in range(1, n + 1):
+            if match_of[w][t] is None:
+                raise RuntimeError(f"Bad RR: team {t} missing in week {w}")
+    return tuple(tuple(row) for row in match_of)
@@ -2,7 +2,11 @@
 import sys
 import time
 import argparse
+import os
 import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
 from pathlib import Path
 from z3 import sat, unsat
 
@@ -12,44 +16,16 @@ ROOT = SRC_DIR.parent
 
 sys.path.insert(0, str(SRC_DIR))
 
-from io_json import write_result_json
-from smt_period_core_bool import build_model
+from io_json import write_result_json, load_results, save_results
+from smt_period_core_bool import build_model, extract_schedule, fairness_value, parallel_threads, z3_parallel, PARALLEL_MIN_N
 from smt2_export import write_smt2_file, per_var, home_var
 from smt2_parse import parse_status, parse_get_value
+from portfolio import run_portfolio
 
 TIME_LIMIT = 300
 ALL_N = [6, 8, 10, 12, 14, 16, 18, 20, 22, 24]
 
 
-def extract_schedule_z3(model, weeks, X, home, n):
-    P = n // 2
-    W = n - 1
-    M = n // 2
-    sol = [[None for _ in range(W)] for _ in range(P)]
-
-    for w in range(W):
-        for m in range(M):
-            chosen_p = None
-            for p in range(P):
-                if model.evaluate(X[w][m][p], model_completion=True):
-                    chosen_p = p
-                    break
-            if chosen_p is None:
-                continue
-            a, b = weeks[w][m]
-            if home is None:
-                sol[chosen_p][w] = [a, b]
-            else:
-                hv = bool(model.evaluate(home[w][m], model_completion=True))
-                sol[chosen_p][w] = [a, b] if hv else [b, a]
-
-    for p in range(P):
-        for w in range(W):
-            if sol[p][w] is None:
-                return []
-    return sol
-
-
 def decode_schedule_env(env, weeks, W, P, with_home: bool):
     sol = [[None for _ in range(W)] for _ in range(P)]
 
@@ -76,14 +52,23 @@ def decode_schedule_env(env, weeks, W, P, with_home: bool):
 
 def run_external(backend: str, smt2_path: Path, timeout_s: int):
     if backend == "cvc5":
-        cmd = ["cvc5", "--lang", "smt2", "--produce-models", str(smt2_path)]
+        cmd = ["cvc5", "--lang", "smt2", "--produce-models", f"--tlimit={timeout_s * 1000}", str(smt2_path)]
+    elif backend == "z3cli":
+        # same SMT-LIB file through the z3 binary: no z3py objects are built
+        cmd = ["z3", "-smt2", f"-T:{timeout_s}", str(smt2_path)]
+    elif backend == "yices":
+        cmd = ["yices-smt2", f"--timeout={timeout_s}", str(smt2_path)]
     elif backend == "opensmt":
         cmd = ["opensmt", str(smt2_path)]
     else:
         raise ValueError(f"Unknown external backend: {backend}")
 
-    proc = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout_s)
-    return proc.stdout, proc.stderr
+    # Output goes to a temp file rather than a pipe: verbose solvers cannot
+    # fill the pipe buffer, and stderr is never parsed.
+    with tempfile.TemporaryFile("w+", encoding="utf-8") as out_f:
+        subprocess.run(cmd, stdout=out_f, stderr=subprocess.DEVNULL, timeout=timeout_s)
+        out_f.seek(0)
+        return out_f.read()
 
 
 def run_one(
@@ -94,49 +79,53 @@ def run_one(
     max_diff=None,
     backend: str = "z3",
     z3_opt: bool = False,
+    z3_threads: int = None,
 ):
     """
     Semantics (as you requested):
       - backend=="z3" and z3_opt==True: use Z3 Optimize() and minimize D (no max_diff feasibility).
       - backend=="z3" and z3_opt==False: plain decision model (no fairness vars).
-      - backend in {"cvc5","opensmt"}: decision if max_diff is None, else feasibility with fixed max_diff.
+      - backend in {"z3cli","cvc5","yices","opensmt"}: decision if max_diff is None, else feasibility with fixed max_diff.
+    z3_threads caps the Z3 thread count (default: parallel_threads()).
     """
     t_start = time.time()
 
     if backend == "z3":
-        s, weeks, X, home, W, P, D_var = build_model(
-            n=n,
-            use_sym=sym,
-            anchor_week=0,
-            # Only create home/fairness constraints when doing Z3 optimization
-            with_home=True if z3_opt else False,
-            # For Z3 optimization, max_diff is not used (we minimize internal D)
-            max_diff=None,
-            optimize=True if z3_opt else False,
-            timeout_ms=TIME_LIMIT * 1000,
-            pin_team1_weeks=pin_team1_weeks,
-        )
-
-        r = s.check()
-
-        if r == sat:
-            model = s.model()
-            sol = extract_schedule_z3(model, weeks, X, home, n)
-            elapsed = min(time.time() - t_start, TIME_LIMIT)
+        threads = parallel_threads() if z3_threads is None else z3_threads
+        with z3_parallel(threads if n >= PARALLEL_MIN_N else 1):
+            s, weeks, X, home, W, P, D_var = build_model(
+                n=n,
+                use_sym=sym,
+                anchor_week=0,
+                # Only create home/fairness constraints when doing Z3 optimization
+                with_home=True if z3_opt else False,
+                # For Z3 optimization, max_diff is not used (we minimize internal D)
+                max_diff=None,
+                optimize=True if z3_opt else False,
+                timeout_ms=TIME_LIMIT * 1000,
+                pin_team1_weeks=pin_team1_weeks,
+            )
+
+            r = s.check()
+
+            if r == sat:
+                model = s.model()
+                sol = extract_schedule(model, weeks, n, with_home=home is not None)
+                elapsed = min(time.time() - t_start, TIME_LIMIT)
+
+                if z3_opt:
+                    # optimization case: return D*
+                    Dstar = fairness_value(model, D_var, W)
+                    return (elapsed, "sat", sol, Dstar) if sol else (TIME_LIMIT, "timeout", [], None)
+
+                return (elapsed, "sat", sol, None) if sol else (TIME_LIMIT, "timeout", [], None)
+
+            if r == unsat:
+                elapsed = min(time.time() - t_start, TIME_LIMIT)
+                return elapsed, "unsat", [], None
 
-            if z3_opt:
-                # optimization case: return D*
-                Dstar = model.evaluate(D_var, model_completion=True).as_long()
-                return (elapsed, "sat", sol, Dstar) if sol else (TIME_LIMIT, "timeout", [], None)
-
-            return (elapsed, "sat", sol, None) if sol else (TIME_LIMIT, "timeout", [], None)
-
-        if r == unsat:
             elapsed = min(time.time() - t_start, TIME_LIMIT)
-            return elapsed, "unsat", [], None
-
-        elapsed = min(time.time() - t_start, TIME_LIMIT)
-        return elapsed, "timeout", [], None
+            return elapsed, "timeout", [], None
 
     # External solvers path (SMT-LIB)
     tmp_dir = ROOT / "res" / "SMT" / "smt2"
@@ -164,7 +153,7 @@ def run_one(
     )
 
     try:
-        stdout, stderr = run_external(backend, out_path, TIME_LIMIT)
+        stdout = run_external(backend, out_path, TIME_LIMIT)
     except subprocess.TimeoutExpired:
         return TIME_LIMIT, "timeout", []
     except FileNotFoundError:
@@ -227,6 +216,38 @@ def key_for(cfg, D=None):
         return k
 
 
+def run_config(n: int, cfg, z3_threads=None):
+    """
+    Run one approach of the run-all grid for one n.
+    Returns (key, time, status, sol, obj); writing the result is left to the caller.
+    z3_threads: as in run_one.
+    """
+    backend = cfg["backend"]
+    sym = cfg["sym"]
+    pin = cfg["pin"]
+    key = key_for(cfg)
+
+    if not cfg["opt"]:
+        if backend == "z3":
+            t, st, sol, _ = run_one(n, sym=sym, pin_team1_weeks=pin, max_diff=None, backend="z3", z3_opt=False,
+                                    z3_threads=z3_threads)
+        else:
+            t, st, sol = run_one(n, sym=sym, pin_team1_weeks=pin, max_diff=None, backend=backend)
+        return key, t, st, sol, None
+
+    # Z3 Optimize(): single run, no D suffix in key_for
+    t, st, sol, Dstar = run_one(n, sym=sym, pin_team1_weeks=pin, max_diff=None, backend="z3", z3_opt=True,
+                                z3_threads=z3_threads)
+    if st == "sat":
+        return key, t, "sat", sol, Dstar
+    return key, TIME_LIMIT, "timeout", [], None
+
+
+def record(json_path: Path, data, key, t, st, sol, obj):
+    write_result_json(key, str(json_path), t, st, sol, obj=obj, data=data)
+    print(f"[{key}] status={st} time={t:.3f}s" + (f" obj={obj}" if obj is not None else ""))
+
+
 def parse_csv_ints(s: str):
     out = []
     for part in s.split(","):
@@ -243,17 +264,22 @@ def main():
 
     parser.add_argument("--sym", action="store_true", help="enable symmetry breaking")
     parser.add_argument("--pin-team1", type=int, default=0, help="pin team 1 match to period 0 for first k weeks")
-    parser.add_argument("--backend", type=str, default="z3", choices=["z3", "cvc5", "opensmt"], help="solver backend")
+    parser.add_argument("--backend", type=str, default="z3", choices=["z3", "z3cli", "cvc5", "yices", "opensmt"], help="solver backend")
 
     parser.add_argument("--opt", action="store_true", help="run fairness optimization (z3 uses Optimize; externals sweep max_diff)")
     parser.add_argument("--maxD", type=int, default=1, help="maximum max_diff to try when --opt is enabled (externals only)")
 
     parser.add_argument("--all", action="store_true", help="run all combinations")
-    parser.add_argument("--backends", type=str, default="", help="comma-separated backends: z3,cvc5,opensmt")
+    parser.add_argument("--backends", type=str, default="", help="comma-separated backends: z3,z3cli,cvc5,yices,opensmt")
     parser.add_argument("--modes", type=str, default="", help="comma-separated modes: decision,opt")
     parser.add_argument("--sb", type=int, choices=[0, 1], default=None, help="restrict SB off/on")
     parser.add_argument("--pins", type=str, default="", help="comma-separated pin values, e.g. 0,1,2")
     parser.add_argument("--models", type=str, default="", help="comma-separated exact keys to run")
+    parser.add_argument("--portfolio", action="store_true",
+                        help="race the plain and SB variants of --backend (and --opt) per n, keep the first answer")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="number of external solver runs executed in parallel (--all; "
+                             "default: the cores left over by the Z3 runs)")
 
     args = parser.parse_args()
 
@@ -279,8 +305,12 @@ def main():
 
             if "_Z3_" in k:
                 cfg["backend"] = "z3"
+            elif "_Z3CLI_" in k:
+                cfg["backend"] = "z3cli"
             elif "_CVC5_" in k:
                 cfg["backend"] = "cvc5"
+            elif "_YICES_" in k:
+                cfg["backend"] = "yices"
             elif "_OPENSMT_" in k:
                 cfg["backend"] = "opensmt"
             else:
@@ -312,6 +342,7 @@ def main():
 
         for n in N_VALUES:
             json_path = out_dir / f"{n}.json"
+            data = load_results(json_path)
             print(f"\n=== SMT n={n} ===")
             for cfg in selected:
                 backend = cfg["backend"]
@@ -323,7 +354,7 @@ def main():
                         t, st, sol, _ = run_one(n, sym=sym, pin_team1_weeks=pin, max_diff=None, backend=backend, z3_opt=False)
                     else:
                         t, st, sol = run_one(n, sym=sym, pin_team1_weeks=pin, max_diff=None, backend=backend)
-                    write_result_json(cfg["forced_key"], str(json_path), t, st, sol, obj=None)
+                    write_result_json(cfg["forced_key"], str(json_path), t, st, sol, obj=None, data=data)
                     print(f"[{cfg['forced_key']}] status={st} time={t:.3f}s")
                 else:
                     # OPT
@@ -331,14 +362,42 @@ def main():
                         # Ignore forced_D: z3 uses Optimize() to find D*
                         t, st, sol, Dstar = run_one(n, sym=sym, pin_team1_weeks=pin, max_diff=None, backend="z3", z3_opt=True)
                         if st == "sat":
-                            write_result_json(cfg["forced_key"], str(json_path), t, "sat", sol, obj=Dstar)
+                            write_result_json(cfg["forced_key"], str(json_path), t, "sat", sol, obj=Dstar, data=data)
                             print(f"[{cfg['forced_key']}] status=sat time={t:.3f}s obj={Dstar}")
                         else:
-                            write_result_json(cfg["forced_key"], str(json_path), TIME_LIMIT, "timeout", [], obj=None)
+                            write_result_json(cfg["forced_key"], str(json_path), TIME_LIMIT, "timeout", [], obj=None, data=data)
                             print(f"[{cfg['forced_key']}] status=timeout")
                     else:
-                        write_result_json(cfg["forced_key"], str(json_path), TIME_LIMIT, "timeout", [], obj=None)
+                        write_result_json(cfg["forced_key"], str(json_path), TIME_LIMIT, "timeout", [], obj=None, data=data)
                         print(f"[{cfg['forced_key']}] skipped (external optimization disabled)")
+            save_results(json_path, data)
+        return
+
+    if args.portfolio:
+        if args.opt and args.backend != "z3":
+            print(f"[SMT_{args.backend.upper()}_BOOL_OPT_PORTFOLIO] skipped (external optimization disabled)")
+            return
+        pins = max(0, int(args.pin_team1))
+        cfgs = [
+            {"backend": args.backend, "opt": bool(args.opt), "sym": sb, "pin": pins, "maxD": int(args.maxD)}
+            for sb in (False, True)
+        ]
+        key = f"SMT_{args.backend.upper()}_{'BOOL_OPT' if args.opt else 'DECISION'}_PORTFOLIO"
+        if pins > 0:
+            key += f"_pin1w{pins}"
+
+        # the variants run side by side: split the cores between their Z3s
+        fn = partial(run_config, z3_threads=max(1, (os.cpu_count() or 1) // len(cfgs)))
+
+        for n in N_VALUES:
+            json_path = out_dir / f"{n}.json"
+            data = load_results(json_path)
+            print(f"\n=== SMT portfolio solver={args.backend} n={n} ===")
+            winner, t, st, sol, obj = run_portfolio(fn, n, cfgs, TIME_LIMIT)
+            if winner is not None:
+                print(f"[{key}] won by {winner}")
+            record(json_path, data, key, t, st, sol, obj)
+            save_results(json_path, data)
         return
 
     if not args.all:
@@ -348,6 +407,7 @@ def main():
 
         for n in N_VALUES:
             json_path = out_dir / f"{n}.json"
+            data = load_results(json_path)
             print(f"\n=== SMT solver={backend} n={n} ===")
 
             if args.opt:
@@ -363,10 +423,10 @@ def main():
                         n, sym=sym, pin_team1_weeks=pins, max_diff=None, backend="z3", z3_opt=True
                     )
                     if st == "sat":
-                        write_result_json(base_key, str(json_path), t, "sat", sol, obj=Dstar)
+                        write_result_json(base_key, str(json_path), t, "sat", sol, obj=Dstar, data=data)
                         print(f"[{base_key}] status=sat time={t:.3f}s obj={Dstar}")
                     else:
-                        write_result_json(base_key, str(json_path), TIME_LIMIT, "timeout", [], obj=None)
+                        write_result_json(base_key, str(json_path), TIME_LIMIT, "timeout", [], obj=None, data=data)
                         print(f"[{base_key}] status=timeout")
                 else:
                     print(f"[SMT_{backend.upper()}_BOOL_OPT] skipped (external optimization disabled)")
@@ -383,12 +443,13 @@ def main():
                     key += "_SB"
                 if pins > 0:
                     key += f"_pin1w{pins}"
-                write_result_json(key, str(json_path), t, st, sol, obj=None)
+                write_result_json(key, str(json_path), t, st, sol, obj=None, data=data)
                 print(f"[{key}] status={st} time={t:.3f}s")
+            save_results(json_path, data)
         return
 
     # run-all combinations path 
-    selected_backends = ["z3", "cvc5", "opensmt"]
+    selected_backends = ["z3", "z3cli", "cvc5", "yices", "opensmt"]
     if args.backends.strip():
         selected_backends = [b.strip() for b in args.backends.split(",") if b.strip()]
 
@@ -407,38 +468,46 @@ def main():
     # External optimization removed: keep opt only for z3
     approaches = [cfg for cfg in approaches if (not cfg["opt"]) or cfg["backend"] == "z3"]
 
-    for n in N_VALUES:
-        json_path = out_dir / f"{n}.json"
-        print(f"\n=== SMT n={n} ===")
-        for cfg in approaches:
-            backend = cfg["backend"]
-            sym = cfg["sym"]
-            pin = cfg["pin"]
-
-            if not cfg["opt"]:
-                if backend == "z3":
-                    t, st, sol, _ = run_one(n, sym=sym, pin_team1_weeks=pin, max_diff=None, backend="z3", z3_opt=False)
-                else:
-                    t, st, sol = run_one(n, sym=sym, pin_team1_weeks=pin, max_diff=None, backend=backend)
-
-                key = key_for(cfg)
-                write_result_json(key, str(json_path), t, st, sol, obj=None)
-                print(f"[{key}] status={st} time={t:.3f}s")
-            else:
-                if backend == "z3":
-                    # Z3 Optimize(): single run, no D suffix in key_for
-                    key = key_for(cfg)  # no _D
-                    t, st, sol, Dstar = run_one(n, sym=sym, pin_team1_weeks=pin, max_diff=None, backend="z3", z3_opt=True)
-                    if st == "sat":
-                        write_result_json(key, str(json_path), t, "sat", sol, obj=Dstar)
-                        print(f"[{key}] status=sat time={t:.3f}s obj={Dstar}")
-                    else:
-                        write_result_json(key, str(json_path), TIME_LIMIT, "timeout", [], obj=None)
-                        print(f"[{key}] status=timeout")
-                else:
-                    key = key_for(cfg)
-                    write_result_json(key, str(json_path), TIME_LIMIT, "timeout", [], obj=None)
-                    print(f"[{key}] skipped (external optimization disabled)")
+    # External solvers are independent subprocesses, so they run on a thread
+    # pool; Z3 runs in-process and its Python API is not thread-safe, so those
+    # stay sequential in the main thread while the externals run.
+    # All results are written from the main thread, one at a time.
+    # Every external run of every n is queued up front, so the pool never
+    # drains between sizes while the slowest solver of an n times out.
+    local = [cfg for cfg in approaches if cfg["backend"] == "z3"]
+    external = [cfg for cfg in approaches if cfg["backend"] != "z3"]
+
+    json_paths = {n: out_dir / f"{n}.json" for n in N_VALUES}
+    datas = {n: load_results(json_paths[n]) for n in N_VALUES}
+    # results still missing per n; the n is saved once this drops to 0
+    left = {n: len(local) + len(external) for n in N_VALUES}
+
+    # The pool and the main thread's Z3 share the cores: the pool gets what a
+    # parallel Z3 leaves over, Z3 what the pool leaves over, so the stored
+    # times are not inflated by contention.
+    cores = os.cpu_count() or 1
+    if not local:
+        z3_wanted = 0
+    else:
+        z3_wanted = parallel_threads() if max(N_VALUES) >= PARALLEL_MIN_N else 1
+    jobs = args.jobs if args.jobs is not None else max(1, cores - z3_wanted)
+    z3_threads = max(1, cores - jobs) if external else None
+
+    def done(n, res):
+        record(json_paths[n], datas[n], *res)
+        left[n] -= 1
+        if left[n] == 0:
+            # one write per n instead of a read-modify-write per result
+            save_results(json_paths[n], datas[n])
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(run_config, n, cfg): n for n in N_VALUES for cfg in external}
+        for n in N_VALUES:
+            print(f"\n=== SMT n={n} ===")
+            for cfg in local:
+                done(n, run_config(n, cfg, z3_threads=z3_threads))
+        for fut in as_completed(futures):
+            done(futures[fut], fut.result())
 
 
 if __name__ == "__main__":
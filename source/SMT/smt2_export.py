@@ -7,8 +7,20 @@ Fairness uses Bool home_{w,m}.
 """
 
 from __future__ import annotations
+import hashlib
+from functools import lru_cache
 from pathlib import Path
-from round_robin import circle_method_pairs
+import round_robin
+from round_robin import circle_method_pairs, team_match_index
+
+
+def _inputs_key(*args) -> str:
+    """
+    Digest of the export arguments and of the sources that shape the file;
+    stored next to each .smt2 as a .hash sidecar.
+    """
+    mtimes = [Path(f).stat().st_mtime_ns for f in (__file__, round_robin.__file__)]
+    return hashlib.sha1(repr((args, mtimes)).encode()).hexdigest()[:12]
 
 
 def per_var(w, m) -> str:
@@ -19,6 +31,118 @@ def home_var(w, m) -> str:
     return f"home_{w}_{m}"
 
 
+@lru_cache(maxsize=32)
+def _team_vars(n: int):
+    """
+    Per team t, the names of its W matches' vars, one per week:
+    per[t][w] = per_var(w, m) and home[t][w] = (home_var(w, m), t is first)
+    for the match m that t plays in week w.
+    """
+    weeks = circle_method_pairs(n)
+    match_of = team_match_index(weeks, n)
+    per = [None] * (n + 1)
+    home = [None] * (n + 1)
+    for t in range(1, n + 1):
+        ms = [(w, match_of[w][t]) for w in range(len(weeks))]
+        per[t] = [per_var(w, m) for w, m in ms]
+        home[t] = [(home_var(w, m), weeks[w][m][0] == t) for w, m in ms]
+    return per, home
+
+
+@lru_cache(maxsize=32)
+def _home_sums(n: int):
+    """
+    Per team t, the SMT-LIB term counting its home games; only the bound
+    around it changes between fairness probes.
+    """
+    _, team_home = _team_vars(n)
+    sums = [None] * (n + 1)
+    for t in range(1, n + 1):
+        terms = " ".join([
+            f"(ite {h} 1 0)" if first else f"(ite {h} 0 1)"
+            for h, first in team_home[t]
+        ])
+        sums[t] = f"(+ {terms})"
+    return sums
+
+
+@lru_cache(maxsize=32)
+def _smt2_base(n: int, with_home: bool, add_implied_exact_counts: bool, fixed: tuple = ()) -> str:
+    """
+    Header, declarations and the core STS constraints, as SMT-LIB text.
+    fixed holds (w, m, p) facts (SB / pins): they are asserted as units right
+    after the declarations and folded into the count sums, so no solver sees
+    an (ite (= per p) 1 0) term whose value is already known.
+    """
+    P = n // 2
+    W = n - 1
+    team_per, _ = _team_vars(n)
+    out = []
+
+    fixed_of = {}
+    for w, m, p in fixed:
+        # a conflicting second fact stays visible as its unit assert
+        fixed_of.setdefault(per_var(w, m), p)
+
+    out.append("(set-logic QF_LIA)\n")
+    out.append("(set-option :produce-models true)\n")
+
+    # Decls
+    for w in range(W):
+        for m in range(P):
+            out.append(f"(declare-fun {per_var(w,m)} () Int)\n")
+            if with_home:
+                out.append(f"(declare-fun {home_var(w,m)} () Bool)\n")
+
+    # Unit facts
+    for w, m, p in fixed:
+        out.append(f"(assert (= {per_var(w,m)} {p}))\n")
+
+    # Domains for per vars
+    for w in range(W):
+        for m in range(P):
+            out.append(f"(assert (and (<= 0 {per_var(w,m)}) (< {per_var(w,m)} {P})))\n")
+
+    # Distinct periods per week
+    for w in range(W):
+        vars_w = " ".join(per_var(w, m) for m in range(P))
+        out.append(f"(assert (distinct {vars_w}))\n")
+
+    # Team-period count constraints:
+    # Base STS: count(t,p) <= 2
+    # Implied structure: count(t,p) >= 1 and exactly one p with count(t,p)=1
+    for t in range(1, n + 1):
+        tvars = team_per[t]
+        sum_exprs = []
+        for p in range(P):
+            terms = [f"(ite (= {v} {p}) 1 0)" for v in tvars if v not in fixed_of]
+            k = sum(1 for v in tvars if fixed_of.get(v) == p)
+            if k:
+                terms.append(str(k))
+            sum_expr = f"(+ {' '.join(terms)})" if len(terms) > 1 else (terms[0] if terms else "0")
+            if add_implied_exact_counts:
+                # the count is used four times: name it once as cnt_t_p
+                cnt = f"cnt_{t}_{p}"
+                out.append(f"(declare-fun {cnt} () Int)\n")
+                out.append(f"(assert (= {cnt} {sum_expr}))\n")
+                sum_expr = cnt
+            sum_exprs.append(sum_expr)
+
+            out.append(f"(assert (<= {sum_expr} 2))\n")
+            if add_implied_exact_counts:
+                out.append(f"(assert (>= {sum_expr} 1))\n")
+
+        if add_implied_exact_counts:
+            # exactly one period has count == 1
+            ones = " ".join([f"(ite (= {sum_exprs[p]} 1) 1 0)" for p in range(P)])
+            out.append(f"(assert (= (+ {ones}) 1))\n")
+            # total counts sum to W
+            totals = " ".join(sum_exprs)
+            out.append(f"(assert (= (+ {totals}) {W}))\n")
+
+    return "".join(out)
+
+
 def write_smt2_file(
     n: int,
     out_path: str | Path,
@@ -46,109 +170,65 @@ def write_smt2_file(
     W = n - 1
     weeks = circle_method_pairs(n)
 
-    # Precompute match_of[w][t]
-    match_of = [[None] * (n + 1) for _ in range(W)]
-    for w in range(W):
-        for m, (a, b) in enumerate(weeks[w]):
-            match_of[w][a] = m
-            match_of[w][b] = m
-    for w in range(W):
-        for t in range(1, n + 1):
-            if match_of[w][t] is None:
-                raise RuntimeError(f"Bad RR: team {t} missing in week {w}")
-
-    with out_path.open("w", encoding="utf-8") as f:
-        f.write("(set-logic QF_LIA)\n")
-        f.write("(set-option :produce-models true)\n")
-
-        # Decls
-        for w in range(W):
-            for m in range(P):
-                f.write(f"(declare-fun {per_var(w,m)} () Int)\n")
-                if with_home:
-                    f.write(f"(declare-fun {home_var(w,m)} () Bool)\n")
-
-        # Domains for per vars
-        for w in range(W):
-            for m in range(P):
-                f.write(f"(assert (and (<= 0 {per_var(w,m)}) (< {per_var(w,m)} {P})))\n")
-
-        # Distinct periods per week
-        for w in range(W):
-            vars_w = " ".join(per_var(w, m) for m in range(P))
-            f.write(f"(assert (distinct {vars_w}))\n")
-
-        # Team-period count constraints:
-        # Base STS: count(t,p) <= 2
-        # Implied structure: count(t,p) >= 1 and exactly one p with count(t,p)=1
-        for t in range(1, n + 1):
-            sum_exprs = []
-            for p in range(P):
-                terms = []
-                for w in range(W):
-                    m = match_of[w][t]
-                    terms.append(f"(ite (= {per_var(w,m)} {p}) 1 0)")
-                sum_expr = f"(+ {' '.join(terms)})"
-                sum_exprs.append(sum_expr)
-
-                f.write(f"(assert (<= {sum_expr} 2))\n")
-                if add_implied_exact_counts:
-                    f.write(f"(assert (>= {sum_expr} 1))\n")
-
-            if add_implied_exact_counts:
-                # exactly one period has count == 1
-                ones = " ".join([f"(ite (= {sum_exprs[p]} 1) 1 0)" for p in range(P)])
-                f.write(f"(assert (= (+ {ones}) 1))\n")
-                # total counts sum to W
-                totals = " ".join(sum_exprs)
-                f.write(f"(assert (= (+ {totals}) {W}))\n")
-
-        # Symmetry breaking: name periods by fixing week 0 diagonally
-        # per_{0,m} = m
-        if use_sym:
-            for m in range(P):
-                f.write(f"(assert (= {per_var(0,m)} {m}))\n")
-
-        # Optional extra SB: pin team1 match to period 0 for first k weeks
-        if add_team1_pins > 0:
-            k = min(add_team1_pins, W)
-            for w in range(k):
-                m = match_of[w][1]
-                f.write(f"(assert (= {per_var(w,m)} 0))\n")
-
-        # Fairness
-        if max_diff is not None:
-            if not with_home:
-                raise ValueError("max_diff requires with_home=True")
-
-            # Break global flip symmetry for home bits 
-            if fix_home_sym:
-                f.write(f"(assert {home_var(0,0)})\n")
-
+    # Same arguments and sources as the file on disk: nothing to rewrite
+    key = _inputs_key(n, use_sym, with_home, max_diff, add_implied_exact_counts,
+                      add_team1_pins, fix_home_sym)
+    hash_path = out_path.with_suffix(".hash")
+    if out_path.exists() and hash_path.exists() and hash_path.read_text() == key:
+        return out_path, weeks, W, P
+
+    match_of = team_match_index(weeks, n)
+
+    fixed = []
+    # Symmetry breaking: name periods by fixing week 0 diagonally
+    # per_{0,m} = m
+    if use_sym:
+        fixed += [(0, m, m) for m in range(P)]
+
+    # Optional extra SB: pin team1 match to period 0 for first k weeks
+    if add_team1_pins > 0:
+        k = min(add_team1_pins, W)
+        fixed += [(w, match_of[w][1], 0) for w in range(k)]
+
+    # The model part (with the SB / pin facts folded in) is shared by every
+    # variant of these arguments; only the fairness tail differs, so the base
+    # text is cached and the file is written with a single write.
+    out = [_smt2_base(n, with_home, add_implied_exact_counts, tuple(fixed))]
+
+    # Fairness
+    if max_diff is not None:
+        if not with_home:
+            raise ValueError("max_diff requires with_home=True")
+
+        # Break global flip symmetry for home bits 
+        if fix_home_sym:
+            out.append(f"(assert {home_var(0,0)})\n")
+
+        # |2*hg - W| <= W always holds: no bounds needed
+        if max_diff < W:
+            home_sums = _home_sums(n)
             for t in range(1, n + 1):
-                terms = []
-                for w in range(W):
-                    m = match_of[w][t]
-                    a, b = weeks[w][m]
-                    if t == a:
-                        terms.append(f"(ite {home_var(w,m)} 1 0)")
-                    else:
-                        terms.append(f"(ite {home_var(w,m)} 0 1)")
-                sum_expr = f"(+ {' '.join(terms)})"
-                f.write(f"(assert (<= (- (* 2 {sum_expr}) {W}) {max_diff}))\n")
-                f.write(f"(assert (<= (- {W} (* 2 {sum_expr})) {max_diff}))\n")
-
-        # Solve
-        f.write("(check-sat)\n")
-
-        all_vars = [per_var(w, m) for w in range(W) for m in range(P)]
-        if with_home:
-            all_vars += [home_var(w, m) for w in range(W) for m in range(P)]
-
-        
-        f.write("(get-value (")
-        f.write(" ".join(all_vars))
-        f.write("))\n")
-        f.write("(exit)\n")
+                sum_expr = home_sums[t]
+                out.append(f"(assert (<= (- (* 2 {sum_expr}) {W}) {max_diff}))\n")
+                out.append(f"(assert (<= (- {W} (* 2 {sum_expr})) {max_diff}))\n")
+
+    # Solve
+    out.append("(check-sat)\n")
+
+    all_vars = [per_var(w, m) for w in range(W) for m in range(P)]
+    if with_home:
+        all_vars += [home_var(w, m) for w in range(W) for m in range(P)]
+
+    out.append("(get-value (" + " ".join(all_vars) + "))\n")
+    out.append("(exit)\n")
+
+    # the sidecar goes first and comes back last, and the file itself is
+    # renamed into place, so no solver or later run sees a partial export
+    hash_path.unlink(missing_ok=True)
+    tmp_path = out_path.with_suffix(".smt2.tmp")
+    with tmp_path.open("w", encoding="utf-8") as f:
+        f.write("".join(out))
+    tmp_path.replace(out_path)
+    hash_path.write_text(key)
 
     return out_path, weeks, W, P
@@ -1,8 +1,19 @@
 #!/usr/bin/env python3
 import re
 
+_STATUS_LINE = re.compile(r"^\s*(sat|unsat|unknown)\s*$", re.MULTILINE | re.ASCII)
+_BLOCK_START = re.compile(r"\(\s*\(", re.ASCII)
+# (name value) pairs of a get-value reply; \s also matches the line breaks.
+# Solver output is plain ASCII, so \s skips the Unicode class tables
+_PAIR = re.compile(r"\(\s*([A-Za-z0-9_]+)\s+([^\)\s]+)\s*\)", re.ASCII)
+
 
 def parse_status(stdout: str) -> str:
+    # the check-sat answer is a line of its own, ahead of the get-value block
+    m = _STATUS_LINE.search(stdout)
+    if m:
+        return m.group(1)
+    # no clean status line (errors, odd banners): fall back to any keyword
     s = " ".join(stdout.strip().split()).lower()
     toks = re.findall(r"[a-zA-Z_]+", s)
     if "unsat" in toks:
@@ -14,11 +25,20 @@ def parse_status(stdout: str) -> str:
     return "unknown"
 
 
+def _get_value_block(stdout: str) -> str:
+    """
+    The (get-value ...) reply is the first "((" after the status line;
+    anything the solver printed before it is dropped before tokenizing.
+    """
+    st = _STATUS_LINE.search(stdout)
+    start = st.end() if st else 0
+    m = _BLOCK_START.search(stdout, start)
+    return stdout[m.start():] if m else stdout
+
+
 def parse_get_value(stdout: str) -> dict:
-    text = " ".join(stdout.split())
-    pairs = re.findall(r"\(\s*([A-Za-z0-9_]+)\s+([^\)\s]+)\s*\)", text)
     env = {}
-    for name, val in pairs:
+    for name, val in _PAIR.findall(_get_value_block(stdout)):
         v = val.lower()
         if v == "true":
             env[name] = True
@@ -1,12 +1,85 @@
 #!/usr/bin/env python3
-from z3 import Solver, Bool, Not, SolverFor, PbEq, PbLe, PbGe, Implies, And, Optimize, Int, If, Sum
-from round_robin import circle_method_pairs
+import hashlib
+import os
+import re
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from z3 import Solver, Bool, Not, Or, SolverFor, Then, is_true, PbEq, PbLe, PbGe, Implies, And, Optimize, get_param, set_param
+from z3 import get_version_string
+from itertools import combinations
+import round_robin
+from round_robin import circle_method_pairs, team_match_index
+
+# Preprocessing run in front of the SAT engine for the decision models:
+# constant propagation and equality elimination shrink the goal before it is
+# handed to sat (the probes with fixed pairings go from minutes to seconds
+# for n = 16..20).
+PREPROCESS_TACTICS = ("simplify", "propagate-values", "solve-eqs", "sat")
+
+# Up to this many literals, exactly-one is posted as plain clauses
+# (one at-least-one clause plus pairwise at-most-one) instead of a PB atom
+PAIRWISE_MAX = 8
+
+# From this size on the decision runs are dominated by solver CPU time
+PARALLEL_MIN_N = 14
+
+# Base models (everything but fairness) as SMT-LIB, shared by all drivers:
+# parsing one back is ~30x faster than rebuilding it through the Python API
+MODEL_CACHE_DIR = Path(__file__).resolve().parents[2] / "res" / "SMT" / ".cache"
+
+
+_PARALLEL_PARAMS = ("parallel.enable", "parallel.threads.max", "sat.threads")
+
+
+def parallel_threads(max_threads: int = 8) -> int:
+    return min(max_threads, os.cpu_count() or 1)
+
+
+def enable_parallel(threads: int = None):
+    """
+    Switch Z3 to its parallel mode with threads threads (default
+    parallel_threads()). parallel.* covers the built-in solver factories,
+    sat.threads the sat engine behind the preprocessing chain.
+    Global parameters: the previous values are returned, and the caller
+    hands them to restore_params once its checks are done so later solvers
+    in the process are not affected.
+    """
+    threads = parallel_threads() if threads is None else threads
+    if threads <= 1:
+        return {}
+    saved = {k: get_param(k) for k in _PARALLEL_PARAMS}
+    set_param("parallel.enable", True)
+    set_param("parallel.threads.max", threads)
+    set_param("sat.threads", threads)
+    return saved
+
+
+def restore_params(saved):
+    for k, v in saved.items():
+        set_param(k, v)
+
+
+@contextmanager
+def z3_parallel(threads: int = None):
+    """
+    enable_parallel for the checks inside the block only.
+    """
+    saved = enable_parallel(threads)
+    try:
+        yield
+    finally:
+        restore_params(saved)
 
 
 def pb_exactly_one(s: Solver, lits):
     """
     sum(lits) == 1 
     """
+    if len(lits) <= PAIRWISE_MAX:
+        s.add(Or(lits))
+        s.add([Or(Not(a), Not(b)) for a, b in combinations(lits, 2)])
+        return
     s.add(PbEq([(x, 1) for x in lits], 1))
 
 
@@ -14,6 +87,8 @@ def pb_at_most_k(s: Solver, lits, k: int):
     """
     sum(lits) <= k 
     """
+    if len(lits) <= k:
+        return
     s.add(PbLe([(x, 1) for x in lits], k))
 
 
@@ -27,11 +102,172 @@ def pb_at_least_k(s: Solver, lits, k: int):
 def pb_between_1_and_2(s: Solver, lits):
     """
     Enforce 1 <= sum(lits) <= 2
+    The lower bound is a plain clause, only the upper bound needs a PB atom.
     """
-    pb_at_least_k(s, lits, 1)
+    s.add(Or(lits))
     pb_at_most_k(s, lits, 2)
 
 
+# X_w_m_p / home_w_m, as declared in build_model
+_VAR_RE = re.compile(r"(X|home)_(\d+)_(\d+)(?:_(\d+))?$", re.ASCII)
+
+
+def extract_schedule(model, weeks, n: int, with_home: bool = False):
+    """
+    sol[p][w] = [home, away] from a model of build_model, or [] if some slot
+    is empty. Walks the model's declarations once and parses the X / home
+    names back to indices instead of probing every (w, m, p); a Bool missing
+    from the model is unconstrained, i.e. False on completion.
+    """
+    P = n // 2
+    W = n - 1
+    sol = [[None for _ in range(W)] for _ in range(P)]
+
+    placed = []
+    home_true = set()
+    match = _VAR_RE.match
+    for d in model.decls():
+        m = match(d.name())
+        if m is None or not is_true(model[d]):
+            continue
+        if m[1] == "X":
+            placed.append((int(m[2]), int(m[3]), int(m[4])))
+        else:
+            home_true.add((int(m[2]), int(m[3])))
+
+    for w, mi, p in placed:
+        a, b = weeks[w][mi]
+        if with_home and (w, mi) not in home_true:
+            a, b = b, a
+        sol[p][w] = [a, b]
+
+    for row in sol:
+        if None in row:
+            return []
+    return sol
+
+
+def fairness_constraints(weeks, home, W: int, D):
+    """
+    |home games - away games| <= D for every team, i.e. |2*hg - W| <= D,
+    for a fixed int D. Returned as a list so callers can guard them.
+
+    This is a pure cardinality constraint on the home literals,
+      ceil((W-D)/2) <= hg <= floor((W+D)/2)
+    so it is given to Z3 as PbGe/PbLe (PbEq when both bounds meet) instead
+    of an arithmetic sum. For D >= W it holds for every schedule and the
+    list is empty.
+    """
+    if D >= W:
+        return []
+    n = 2 * len(weeks[0])
+    match_of = team_match_index(weeks, n)
+    out = []
+    for t in range(1, n + 1):
+        # literal "t plays at home in week w"
+        hl = [
+            home[w][m] if weeks[w][m][0] == t else Not(home[w][m])
+            for w, m in ((w, match_of[w][t]) for w in range(W))
+        ]
+        lo, hi = (W - D + 1) // 2, (W + D) // 2
+        wl = [(x, 1) for x in hl]
+        if lo == hi:
+            out.append(PbEq(wl, lo))
+        else:
+            out.append(PbGe(wl, lo))
+            out.append(PbLe(wl, hi))
+    return out
+
+
+def fairness_value(model, ladder, W: int) -> int:
+    """
+    D* of an optimized model: the smallest rung of the ladder that holds
+    (D = W is always satisfied and has no rung).
+    """
+    for k, g in ladder:
+        if is_true(model[g]):
+            return k
+    return W
+
+
+@lru_cache(maxsize=None)
+def _encoder_digest() -> str:
+    """
+    Digest of what the cached base models are built from: this module
+    (_add_base, the exactly-one encodings, the symmetry breaking), the
+    pairing generator and the z3 version writing the SMT-LIB. Part of the
+    cache file names, so editing any of them invalidates the cache.
+    """
+    h = hashlib.blake2b(Path(__file__).read_bytes(), digest_size=8)
+    h.update(Path(round_robin.__file__).read_bytes())
+    h.update(get_version_string().encode())
+    return h.hexdigest()
+
+
+def _add_base(s, weeks, X, home, n, use_sym, pin_team1_weeks):
+    """
+    Every constraint of the model except fairness: the part that depends
+    only on (n, with_home, use_sym, pin_team1_weeks) and can be cached.
+    """
+    W = n - 1
+    M = P = n // 2
+
+    if home is not None:
+        # Break global flip symmetry for home bits
+        s.add(home[0][0])
+
+    # One pass per week for the two weekly constraints:
+    # 1 each match assigned to exactly one period
+    # 2 each period has exactly one match per week
+    #   (M == P and (1) places every match, so at most one is enough)
+    for Xw in X:
+        for m in range(M):
+            pb_exactly_one(s, Xw[m])
+        for p in range(P):
+            pb_at_most_k(s, [Xw[m][p] for m in range(M)], 1)
+
+    match_of = team_match_index(weeks, n)
+
+    # 3 team appears in same period at most twice
+        #  For each team t and period p:
+    #    occurrences are forced to be either 1 or 2 (never 0),
+    #    and each team has exactly one period where it occurs exactly 1 time.
+    one = [[Bool(f"one_{t}_{p}") for p in range(P)] for t in range(1, n + 1)]
+
+    for t in range(1, n + 1):
+        for p in range(P):
+            lits = [X[w][match_of[w][t]][p] for w in range(W)]
+            wlits = [(x, 1) for x in lits]
+
+            # 1 <= occ(t,p) <= 2   Implied constraint
+            pb_between_1_and_2(s, lits)
+
+            # Define one[t][p] <-> (occ(t,p) == 1)
+            # If one[t][p] then occ <= 1 (and we already have occ >= 1)
+            s.add(Implies(one[t - 1][p], PbLe(wlits, 1)))
+
+            # If NOT one[t][p], force occ >= 2 (together with occ <= 2 -> occ == 2)
+            s.add(Implies(Not(one[t - 1][p]), PbGe(wlits, 2)))
+
+        # Exactly one period has occ(t,p) == 1
+        pb_exactly_one(s, one[t - 1])
+
+
+    if pin_team1_weeks > 0:
+        k = min(pin_team1_weeks, W)
+        for w in range(k):
+            m = match_of[w][1]
+            s.add(X[w][m][0])
+
+    if use_sym:
+        for m in range(M):
+            s.add(X[0][m][m])
+
+       #aw = anchor_week % W
+       #for m in range(M):
+       #    s.add(X[aw][m][m])
+
+
 def build_model(
     n: int,
     use_sym: bool = False,
@@ -40,7 +276,13 @@ def build_model(
     max_diff: int | None = None,
     timeout_ms: int = 300_000,
     pin_team1_weeks: int = 0,
-    optimize: bool = False
+    optimize: bool = False,
+    pb_solver: str = "totalizer",
+    preprocess: bool = True,
+    maxsat_engine: str = "maxres",
+    random_seed: int = 0,
+    logic: str | None = None,
+    cache: bool = True,
 ):
 
     if n % 2 != 0:
@@ -72,10 +314,20 @@ def build_model(
     if optimize:
         s = Optimize()
         solver_tag = "Z3_OPT"
+        # the objective is a set of soft Bool rungs: solve it as MaxSAT
+        # (core-guided) rather than by arithmetic optimization
+        s.set("maxsat_engine", maxsat_engine)
     else:
         solver_tag = "SAT"
         try:
-            s = SolverFor("SAT")
+            if logic is not None:
+                # explicit logic-specialized solver (e.g. "QF_LIA", "QF_FD")
+                s = SolverFor(logic)
+                solver_tag = logic
+            elif preprocess:
+                s = Then(*PREPROCESS_TACTICS).solver()
+            else:
+                s = SolverFor("SAT")
         except Exception:
             s = Solver()
             solver_tag = "SMT"
@@ -83,105 +335,66 @@ def build_model(
     s.set("timeout", timeout_ms)
 
     try:
-        s.set("random_seed", 0)
+        s.set("random_seed", random_seed)
     except Exception:
         pass
 
+    # Set on this solver only, so nothing leaks to later solvers of the
+    # process: the sat engine behind the preprocessing chain has its own
+    # seed, and the model is almost only cardinality constraints, so the
+    # engine keeps them as native cardinality/PB constraints (totalizer for
+    # the rest) instead of bit-blasting them. Optimize takes no sat.*
+    # parameters and keeps its defaults (same MaxSAT times at n=12..16).
+    if not optimize:
+        try:
+            s.set("sat.random_seed", random_seed)
+            s.set("sat.cardinality.solver", True)
+            s.set("sat.pb.solver", pb_solver)
+        except Exception:
+            pass
+
     X = [[[Bool(f"X_{w}_{m}_{p}") for p in range(P)] for m in range(M)] for w in range(W)]
 
     home = None
     if with_home:
         home = [[Bool(f"home_{w}_{m}") for m in range(M)] for w in range(W)]
 
-    # 1 each match assigned to exactly one period
-    for w in range(W):
-        for m in range(M):
-            pb_exactly_one(s, X[w][m])
-
-    # 2 each period has exactly one match per week
-    for w in range(W):
-        for p in range(P):
-            pb_exactly_one(s, [X[w][m][p] for m in range(M)])
-
-    # Precompute match_of[w][t]
-    match_of = [[None] * (n + 1) for _ in range(W)]
-    for w in range(W):
-        for m, (a, b) in enumerate(weeks[w]):
-            match_of[w][a] = m
-            match_of[w][b] = m
-
-    # 3 team appears in same period at most twice
-        #  For each team t and period p:
-    #    occurrences are forced to be either 1 or 2 (never 0),
-    #    and each team has exactly one period where it occurs exactly 1 time.
-    one = [[Bool(f"one_{t}_{p}") for p in range(P)] for t in range(1, n + 1)]
-
-    for t in range(1, n + 1):
-        for p in range(P):
-            lits = [X[w][match_of[w][t]][p] for w in range(W)]
-
-            # 1 <= occ(t,p) <= 2   Implied constraint
-            pb_between_1_and_2(s, lits)
-
-            # Define one[t][p] <-> (occ(t,p) == 1)
-            # If one[t][p] then occ <= 1 (and we already have occ >= 1)
-            s.add(Implies(one[t - 1][p], PbLe([(x, 1) for x in lits], 1)))
-
-            # If NOT one[t][p], force occ >= 2 (together with occ <= 2 -> occ == 2)
-            s.add(Implies(Not(one[t - 1][p]), PbGe([(x, 1) for x in lits], 2)))
-
-        # Exactly one period has occ(t,p) == 1
-        pb_exactly_one(s, one[t - 1])
-
-
-    if pin_team1_weeks > 0:
-        k = min(pin_team1_weeks, W)
-        for w in range(k):
-            m = match_of[w][1]
-            s.add(X[w][m][0])
-
-    if use_sym:
-        for m in range(M):
-            s.add(X[0][m][m])
-
-       #aw = anchor_week % W
-       #for m in range(M):
-       #    s.add(X[aw][m][m])
+    # The parsed constants are the same z3 terms as X / home above (same
+    # names, same context), so the handles stay valid on a cache hit
+    cache_path = MODEL_CACHE_DIR / (
+        f"{n}_h{int(with_home)}_sym{int(use_sym)}_pin{pin_team1_weeks}_{_encoder_digest()}.smt2"
+    )
+    if cache and cache_path.exists():
+        s.from_file(str(cache_path))
+    else:
+        base = Solver() if cache else s
+        _add_base(base, weeks, X, home, n, use_sym, pin_team1_weeks)
+        if cache:
+            MODEL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            # unique tmp name: parallel probes may build the same n at once
+            tmp = cache_path.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_text(base.to_smt2())
+            tmp.replace(cache_path)
+            s.add(base.assertions())
 
     D_var = None
     if max_diff is not None or optimize:
         if home is None:
             raise ValueError("Fairness requires with_home=True")
 
-        # Create the optimization variable if needed
         if optimize:
-            D_var = Int("D")
-            # Tight bounds: W is odd => D >= 1, always D <= W
-            s.add(D_var >= 1)
-            s.add(D_var <= W)
+            # MaxSAT over a ladder of Bool rungs fair_le_k -> (D <= k) instead
+            # of an Int D over If-sums: W is odd, so D takes the odd values
+            # 1, 3, ..., W and only k < W needs a rung. Each satisfied rung
+            # is one soft constraint, so the optimum sits at D*.
+            D_var = [(k, Bool(f"fair_le_{k}")) for k in range(1, W, 2)]
+            for (_, g), (_, g_next) in zip(D_var, D_var[1:]):
+                s.add(Implies(g, g_next))
+            for k, g in D_var:
+                s.add(Implies(g, And(fairness_constraints(weeks, home, W, k))))
+                s.add_soft(g)
         else:
             D_var = max_diff  # fixed bound (int)
-
-        # Break global flip symmetry for home bits
-        s.add(home[0][0])
-
-        for t in range(1, n + 1):
-            terms = []
-            for w in range(W):
-                m = match_of[w][t]
-                a, b = weeks[w][m]
-                if t == a:
-                    terms.append(If(home[w][m], 1, 0))
-                else:
-                    terms.append(If(home[w][m], 0, 1))
-
-            hg = Sum(terms)
-
-            # |2*hg - W| <= D_var
-            s.add(2 * hg - W <= D_var)
-            s.add(W - 2 * hg <= D_var)
-
-        if optimize:
-            s.minimize(D_var)
+            s.add(fairness_constraints(weeks, home, W, D_var))
 
     return s, weeks, X, home, W, P, D_var
\ No newline at end of file
@@ -1,50 +1,122 @@
 #!/usr/bin/env python3
-import sys, time
+import os, sys, time
 from pathlib import Path
-from z3 import sat, unsat
+from z3 import sat, unsat, set_param
 
 SRC_DIR = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(SRC_DIR))
 
 from io_json import write_result_json
-from smt_period_core_bool import build_model
+from smt_period_core_bool import build_model, extract_schedule, parallel_threads, z3_parallel, PARALLEL_MIN_N
+from portfolio import run_portfolio
+from round_robin import team_match_index
 
 TIME_LIMIT = 300
 
-def extract_schedule(model, weeks, X, n):
-    P = n // 2
-    W = n - 1
-    M = n // 2
-    sol = [[None for _ in range(W)] for _ in range(P)]
-    for w in range(W):
-        for m in range(M):
-            for p in range(P):
-                if model.evaluate(X[w][m][p], model_completion=True):
-                    a, b = weeks[w][m]
-                    sol[p][w] = [a, b]
-    return sol
+# upper bound on the portfolio workers: seeds beyond this rarely change the
+# winner and each one is a full z3 process with its own copy of the model
+MAX_SEEDS = 8
+
+# sat engine settings cycled over the portfolio workers: no single one wins
+# (luby restarts solve n=16 with SB in 0.2s instead of 6s, but the plain
+# model goes from 0.2s to 9s), so they race like the seeds do
+Z3_TUNINGS = (
+    {},
+    {"sat.restart": "luby"},
+    {"sat.gc": "glue", "sat.phase": "caching"},
+)
 
 def is_full(sol):
     return sol and all(all(c is not None for c in row) for row in sol)
 
-def solve(n, timeout_s=300):
-    s, weeks, X, home, W, P = build_model(n, use_sym=False, timeout_ms=timeout_s*1000)
-    t0 = time.time()
-    r = s.check()
-    t = time.time() - t0
+def solve(n, timeout_s=300, use_sym=False, anchor_week=0, random_seed=0, parallel=True, params=None):
+    # global z3 parameters: meant for one solve per process (portfolio workers)
+    for k, v in (params or {}).items():
+        set_param(k, v)
+    with z3_parallel(parallel_threads() if parallel and n >= PARALLEL_MIN_N else 1):
+        s, weeks, X, home, W, P, _ = build_model(
+            n, use_sym=use_sym, anchor_week=anchor_week, timeout_ms=timeout_s*1000, random_seed=random_seed
+        )
+        t0 = time.time()
+        r = s.check()
+        t = time.time() - t0
     if r == sat:
-        sol = extract_schedule(s.model(), weeks, X, n)
+        sol = extract_schedule(s.model(), weeks, n)
         return ("sat" if is_full(sol) else "unknown"), sol, t
     if r == unsat:
         return "unsat", [], t
     return "unknown", [], t
 
-if __name__ == "__main__":
-    n = int(sys.argv[1])
-    st, sol, t = solve(n)
+def _seeded(n, cfg):
+    # portfolio worker: one single-threaded solve() with its own seed
+    st, sol, t = solve(n, timeout_s=cfg["timeout_s"], use_sym=cfg["use_sym"],
+                       anchor_week=cfg["anchor_week"], random_seed=cfg["seed"], parallel=False,
+                       params=cfg["params"])
+    return cfg["seed"], t, st, sol, None
+
+def solve_portfolio(n, timeout_s=300, use_sym=False, anchor_week=0, seeds=None):
+    """
+    Same model under several random seeds (and Z3_TUNINGS, cycled) in
+    parallel processes; the first sat/unsat answer wins. Same return value
+    as solve(), with the winner's check() time like solve() reports.
+    Default seeds: one per CPU, at most MAX_SEEDS.
+    """
+    seeds = seeds if seeds is not None else range(min(os.cpu_count() or 1, MAX_SEEDS))
+    cfgs = [{"seed": k, "timeout_s": timeout_s, "use_sym": use_sym, "anchor_week": anchor_week,
+             "params": Z3_TUNINGS[i % len(Z3_TUNINGS)]} for i, k in enumerate(seeds)]
+    _seed, t, st, sol, _ = run_portfolio(_seeded, n, cfgs, timeout_s, worker_time=True)
+    return (st if st in ("sat", "unsat") else "unknown"), sol, t
+
+def _cube(n, cfg):
+    # partition worker: fresh model, team 1 forced into period cfg["p"] in
+    # the cube week, passed as an assumption
+    s, weeks, X, home, W, P, _ = build_model(
+        n, use_sym=cfg["use_sym"], anchor_week=cfg["anchor_week"], timeout_ms=cfg["timeout_s"]*1000
+    )
+    w = cfg["week"]
+    m = team_match_index(weeks, n)[w][1]
+    t0 = time.time()
+    r = s.check(X[w][m][cfg["p"]])
+    t = time.time() - t0
+    if r == sat:
+        sol = extract_schedule(s.model(), weeks, n)
+        return cfg["p"], t, ("sat" if is_full(sol) else "unknown"), sol, None
+    return cfg["p"], t, ("unsat" if r == unsat else "unknown"), [], None
+
+def solve_cube(n, timeout_s=300, use_sym=False, anchor_week=0):
+    """
+    Cube-and-conquer on the period of team 1's match in the first week the
+    symmetry breaking leaves open: one disjoint cube per period, each in its
+    own process. First sat wins, unsat needs all cubes. Same return value as
+    solve(), timed like it: the check() time of the concluding cube.
+    """
+    cfgs = [{"p": p, "week": 1 if use_sym else 0, "timeout_s": timeout_s,
+             "use_sym": use_sym, "anchor_week": anchor_week} for p in range(n // 2)]
+    _p, t, st, sol, _ = run_portfolio(_cube, n, cfgs, timeout_s, partition=True, worker_time=True)
+    return (st if st in ("sat", "unsat") else "unknown"), sol, t
+
+def main(use_sym=False):
+    # --cube: cube-and-conquer on team 1's period
+    # --portfolio: race random seeds (one per CPU) in separate processes
+    cube = "--cube" in sys.argv
+    portfolio = "--portfolio" in sys.argv
+    args = [a for a in sys.argv[1:] if a not in ("--cube", "--portfolio")]
+    n = int(args[0])
+    # the SB entry point (smt_z3_bool_decision_sb.py) also takes anchor_week
+    aw = int(args[1]) if (use_sym and len(args) > 1) else 0
+    if cube:
+        run = solve_cube
+    elif portfolio:
+        run = solve_portfolio
+    else:
+        run = solve
+    st, sol, t = run(n, use_sym=use_sym, anchor_week=aw)
     out_dir = Path(__file__).resolve().parents[2] / "res" / "SMT"
     out_dir.mkdir(parents=True, exist_ok=True)
     out_path = out_dir / f"{n}.json"
-    key = "SMT_Z3_BOOL_DECISION"
+    key = f"SMT_Z3_BOOL_DECISION{'_SB_aw'+str(aw) if use_sym else ''}"
     write_result_json(key, str(out_path), min(t, TIME_LIMIT), "sat" if st=="sat" else "timeout", sol, obj=None)
     print(f"[{key}] n={n} status={st} time={t:.3f}s")
+
+if __name__ == "__main__":
+    main()
@@ -1,71 +1,131 @@
 #!/usr/bin/env python3
-import sys, time
+import os, sys, time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
-from z3 import sat, unsat
+from z3 import sat, unsat, Bool, Implies, And, is_true
 
 SRC_DIR = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(SRC_DIR))
 
 from io_json import write_result_json
-from smt_period_core_bool import build_model
+from smt_period_core_bool import build_model, fairness_constraints, fairness_value, enable_parallel, extract_schedule, restore_params
 
 TIME_LIMIT = 300
-
-def extract_schedule(model, weeks, X, home, n):
-    P = n // 2
-    W = n - 1
-    M = n // 2
-    sol = [[None for _ in range(W)] for _ in range(P)]
-    for w in range(W):
-        for m in range(M):
-            for p in range(P):
-                if model.evaluate(X[w][m][p], model_completion=True):
-                    a, b = weeks[w][m]
-                    if home is None:
-                        sol[p][w] = [a, b]
-                    else:
-                        hv = bool(model.evaluate(home[w][m], model_completion=True))
-                        sol[p][w] = [a, b] if hv else [b, a]
-    return sol
+# upper bound on solve_parallel's probe processes; each one rebuilds the model
+MAX_WORKERS = 8
+# below this many candidate bounds, scan down from hi instead of bisecting
+LINEAR_THRESHOLD = 4
 
 def is_full(sol):
     return sol and all(all(c is not None for c in row) for row in sol)
 
-def solve(n, use_sym=False, anchor_week=0, time_limit_s=300):
+def achieved_diff(sol, n):
+    """max |home - away| over teams for a period x week schedule"""
+    hg = [0] * (n + 1)
+    for row in sol:
+        for h, _a in row:
+            hg[h] += 1
+    W = n - 1
+    return max(abs(2 * hg[t] - W) for t in range(1, n + 1))
+
+def _warm_start(s, model, X, home):
+    """
+    Seed the next check's phases with the last schedule: the tighter bound
+    usually only needs a few home bits / periods changed. Off by default:
+    on n = 14..18 it helped as often as it hurt.
+    """
+    for Xw in X:
+        for Xm in Xw:
+            for x in Xm:
+                s.set_initial_value(x, is_true(model.eval(x, model_completion=True)))
+    for hw in home:
+        for h in hw:
+            s.set_initial_value(h, is_true(model.eval(h, model_completion=True)))
+
+def solve(n, use_sym=False, anchor_week=0, time_limit_s=300, warm=False):
     W = n - 1
-    lo, hi = 0, W
+    # W is odd, so |home - away| is odd as well: 1 <= D* <= W and only odd
+    # bounds need probing
+    lo, hi = 1, W
     best_sol, best = None, None
     proved = True
     start = time.time()
 
-    while lo <= hi:
-        if time.time() - start >= time_limit_s:
-            proved = False
-            break
-        mid = (lo + hi) // 2
-
-        s, weeks, X, home, W2, P2 = build_model(
-            n,
-            use_sym=use_sym,
-            anchor_week=anchor_week,
-            with_home=True,
-            max_diff=mid,
-            timeout_ms=int((time_limit_s - (time.time() - start)) * 1000)
-        )
-
-        r = s.check()
-        if r == sat:
-            sol = extract_schedule(s.model(), weeks, X, home, n)
-            if not is_full(sol):
+    # Build the scheduling model once; each probed bound D is guarded by its
+    # own literal fair_le_D and enabled through check(assumption), so nothing
+    # is ever popped or rebuilt. The solver is the preprocessing tactic
+    # solver, which reruns the tactic chain from scratch on every check:
+    # learned clauses do not carry over, only the model build is shared.
+    s, weeks, X, home, W2, P2, _ = build_model(
+        n,
+        use_sym=use_sym,
+        anchor_week=anchor_week,
+        with_home=True,
+        timeout_ms=time_limit_s * 1000
+    )
+
+    # parallel params set for the tail of the search, undone before returning
+    saved = {}
+    try:
+        while lo <= hi:
+            remaining = time_limit_s - (time.time() - start)
+            if remaining <= 0:
+                proved = False
+                break
+            if best_sol is None:
+                # first check without a bound: its schedule gives hi for free
+                mid = None
+            elif (hi - lo) // 2 + 1 <= LINEAR_THRESHOLD:
+                # few bounds left: each SAT step from hi is a cheap warm check,
+                # the first UNSAT ends the search
+                mid = hi
+            else:
+                mid = lo + ((hi - lo) // 4) * 2
+
+            s.set("timeout", int(remaining * 1000))
+            if mid is None:
+                r = s.check()
+                if r == sat:
+                    model = s.model()
+                    sol = extract_schedule(model, weeks, n, with_home=True)
+                    if not is_full(sol):
+                        proved = False
+                        break
+                    if warm:
+                        _warm_start(s, model, X, home)
+                    best_sol = sol
+                    best = achieved_diff(sol, n)
+                    hi = best - 2
+                    # the remaining steps sit next to the SAT/UNSAT boundary
+                    # and dominate the run time
+                    saved = enable_parallel()
+                    continue
+                proved = False
+                break
+
+            guard = Bool(f"fair_le_{mid}")
+            s.add(Implies(guard, And(fairness_constraints(weeks, home, W, mid))))
+            r = s.check(guard)
+            if r == sat:
+                model = s.model()
+                sol = extract_schedule(model, weeks, n, with_home=True)
+                if not is_full(sol):
+                    proved = False
+                    break
+                if warm:
+                    _warm_start(s, model, X, home)
+                # the model may beat the probed bound
+                best, best_sol = achieved_diff(sol, n), sol
+                hi = best - 2
+            elif r == unsat:
+                lo = mid + 2
+            else:
                 proved = False
+            if not proved:
                 break
-            best, best_sol = mid, sol
-            hi = mid - 1
-        elif r == unsat:
-            lo = mid + 1
-        else:
-            proved = False
-            break
+    finally:
+        restore_params(saved)
 
     total = time.time() - start
     if best_sol is None:
@@ -74,18 +134,134 @@ def solve(n, use_sym=False, anchor_week=0, time_limit_s=300):
     status = "sat" if proved and total < time_limit_s else "timeout"
     return min(total, time_limit_s), status, best_sol, best, proved
 
-if __name__ == "__main__":
-    n = int(sys.argv[1])
-    # opt_sb version passes anchor_weekopt version ignores it
-    use_sym = ("_sb" in Path(__file__).name)
-    aw = int(sys.argv[2]) if (use_sym and len(sys.argv) > 2) else 0
+def _probe(n, use_sym, anchor_week, D, timeout_s):
+    """
+    One fresh model with fairness bound D; returns (D, "sat"|"unsat"|"unknown", sol).
+    """
+    s, weeks, X, home, W, P, _ = build_model(
+        n,
+        use_sym=use_sym,
+        anchor_week=anchor_week,
+        with_home=True,
+        max_diff=D,
+        timeout_ms=max(1, int(timeout_s * 1000)),
+    )
+    r = s.check()
+    if r == sat:
+        sol = extract_schedule(s.model(), weeks, n, with_home=True)
+        return D, ("sat" if is_full(sol) else "unknown"), sol
+    return D, ("unsat" if r == unsat else "unknown"), []
+
+def solve_parallel(n, use_sym=False, anchor_week=0, time_limit_s=300, workers=None):
+    """
+    k-ary version of solve() for multi-core machines: each round probes
+    `workers` bounds spread over [lo, hi] in separate processes, then keeps
+    the interval between the largest UNSAT and the smallest SAT bound.
+    With two workers this is the optimistic/pessimistic pair: the low probe
+    tries to prove a bound, the high one reports a schedule whose achieved
+    D may already beat it. Same return value as solve().
+    Default workers: one per CPU, at most MAX_WORKERS.
+    """
+    W = n - 1
+    workers = workers or min(os.cpu_count() or 1, MAX_WORKERS)
+    # odd bounds only, as in solve()
+    lo, hi = 1, W
+    best_sol, best = None, None
+    proved = True
+    start = time.time()
 
-    t, st, sol, obj, proved = solve(n, use_sym=use_sym, anchor_week=aw, time_limit_s=TIME_LIMIT)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while lo <= hi:
+            remaining = time_limit_s - (time.time() - start)
+            if remaining <= 0:
+                proved = False
+                break
+            cands = (hi - lo) // 2 + 1
+            k = min(workers, cands)
+            # k odd points splitting [lo, hi] into k+1 equal parts
+            mids = sorted({lo + 2 * ((i + 1) * cands // (k + 1)) for i in range(k)})
+            futs = [pool.submit(_probe, n, use_sym, anchor_week, D, remaining) for D in mids]
+            results = sorted(f.result() for f in futs)
+
+            sat_ds = [D for D, st, _ in results if st == "sat"]
+            if any(st == "unknown" for D, st, _ in results if not sat_ds or D < sat_ds[0]):
+                proved = False
+                break
+            if sat_ds:
+                d, sol = min((achieved_diff(sol, n), sol) for D, st, sol in results if st == "sat")
+                if best is None or d < best:
+                    best, best_sol = d, sol
+                hi = min(hi, best - 2)
+            unsat_ds = [D for D, st, _ in results if st == "unsat"]
+            if unsat_ds:
+                lo = max(lo, max(unsat_ds) + 2)
+
+    total = time.time() - start
+    if best_sol is None:
+        return total, "timeout", [], None, False
+
+    status = "sat" if proved and total < time_limit_s else "timeout"
+    return min(total, time_limit_s), status, best_sol, best, proved
+
+def solve_optimize(n, use_sym=False, anchor_week=0, time_limit_s=300):
+    """
+    One z3 Optimize call (MaxSAT over the fair_le_k rungs of build_model)
+    instead of an outer search over D; sat means the optimum is proved.
+    On timeout the best model found so far, if any, is returned unproved.
+    Same return value as solve().
+    """
+    start = time.time()
+    s, weeks, X, home, W, P, D_var = build_model(
+        n,
+        use_sym=use_sym,
+        anchor_week=anchor_week,
+        with_home=True,
+        optimize=True,
+        timeout_ms=time_limit_s * 1000,
+    )
+    r = s.check()
+    total = time.time() - start
+    try:
+        model = s.model()
+    except Exception:
+        model = None
+    sol = extract_schedule(model, weeks, n, with_home=True) if model is not None else []
+    if not is_full(sol):
+        return total, "timeout", [], None, False
+
+    proved = r == sat and total < time_limit_s
+    status = "sat" if proved else "timeout"
+    return min(total, time_limit_s), status, sol, fairness_value(model, D_var, W), proved
+
+def main(use_sym=False):
+    # --optimize: single Optimize call instead of the bound search
+    # --warm: bound search with each model seeding the next check's phases
+    # --parallel: probe several bounds per round in separate processes
+    optimize = "--optimize" in sys.argv
+    warm = "--warm" in sys.argv
+    parallel = "--parallel" in sys.argv
+    args = [a for a in sys.argv[1:] if a not in ("--optimize", "--warm", "--parallel")]
+    n = int(args[0])
+    # the SB entry point (smt_z3_bool_opt_sb.py) also takes anchor_week
+    aw = int(args[1]) if (use_sym and len(args) > 1) else 0
+
+    if optimize:
+        run = solve_optimize
+    elif warm:
+        run = partial(solve, warm=True)
+    elif parallel:
+        run = solve_parallel
+    else:
+        run = solve
+    t, st, sol, obj, proved = run(n, use_sym=use_sym, anchor_week=aw, time_limit_s=TIME_LIMIT)
 
     out_dir = Path(__file__).resolve().parents[2] / "res" / "SMT"
     out_dir.mkdir(parents=True, exist_ok=True)
     out_path = out_dir / f"{n}.json"
 
-    key = f"SMT_Z3_BOOL_OPT{'_SB_aw'+str(aw) if use_sym else ''}"
+    key = f"SMT_Z3_BOOL_OPT{'_MAXSAT' if optimize else ''}{'_SB_aw'+str(aw) if use_sym else ''}"
     write_result_json(key, str(out_path), t, st, sol, obj=obj)
     print(f"[{key}] n={n} status={st} time={t:.3f}s obj={obj} proved={proved}")
+
+if __name__ == "__main__":
+    main()
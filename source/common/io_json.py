@@ -1,19 +1,104 @@
+"""
+Result files res/<approach>/<n>.json, shared by the solver entry points:
+one dict per n, approach key -> {time, optimal, obj, sol}.
+"""
 import json
 from pathlib import Path
 
-def write_result_json(approach_name, json_path, solve_time, status, solution_matrix, obj=None):
+# orjson is optional: same output as json.dump(indent=2), several times faster
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
+# path -> (st_mtime_ns, results) of the last file read or written here, so
+# a file this process wrote itself is not parsed again
+_CACHE = {}
+
+
+def _read(json_path):
+    if orjson is not None:
+        return orjson.loads(json_path.read_bytes())
+    with open(json_path, "r") as f:
+        return json.load(f)
+
+
+def load_results(json_path):
+    """
+    Existing results for one n, or {} if the file is missing or unreadable.
+    The caller owns the returned dict (a copy of the cached one).
+    """
     json_path = Path(json_path)
-    json_path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        mtime = json_path.stat().st_mtime_ns
+    except OSError:
+        return {}
+    cached = _CACHE.get(json_path)
+    if cached is not None and cached[0] == mtime:
+        return dict(cached[1])
+    try:
+        data = _read(json_path)
+    except Exception:
+        return {}
+    _CACHE[json_path] = (mtime, data)
+    return dict(data)
 
-    if json_path.exists():
-        try:
-            with open(json_path, "r") as f:
-                data = json.load(f)
-        except Exception:
-            data = {}
+
+def save_results(json_path, data):
+    json_path = Path(json_path)
+    json_path.parent.mkdir(parents=True, exist_ok=True)
+    if orjson is not None:
+        payload = orjson.dumps(data, option=orjson.OPT_INDENT_2)
     else:
-        data = {}
+        # one encode and one write() instead of json.dump's per-token writes
+        payload = json.dumps(data, indent=2).encode()
+    # write beside the target and rename over it: a crash mid-write leaves
+    # the previous results intact instead of a truncated file
+    tmp = json_path.with_suffix(".json.tmp")
+    tmp.write_bytes(payload)
+    tmp.replace(json_path)
+    _CACHE[json_path] = (json_path.stat().st_mtime_ns, dict(data))
+
+
+def write_result(key, json_path, entry, data=None):
+    """
+    Store one ready-made entry under key. If data is given (a dict from
+    load_results), the entry is only added to it and the caller saves it
+    with save_results; otherwise the file is read, updated and written back.
+    """
+    if data is not None:
+        data[key] = entry
+        return
+
+    data = load_results(json_path)
+    data[key] = entry
+    save_results(json_path, data)
+
+
+def write_result_json(approach_name, json_path, solve_time, status, solution_matrix, obj=None, data=None):
+    """
+    status in {"sat", "unsat", "timeout"}.
+
+    SAT (solution found):
+        time  = actual solve time (clipped to 300)
+        optimal = True
+        obj  = int or None
+        sol  = non-empty
+
+    UNSAT (proved within time limit):
+        time    = actual solve time
+        optimal = True
+        obj     = None
+        sol     = []
+
+    TIMEOUT / unknown:
+        time    = 300
+        optimal = False
+        obj     = None
+        sol     = []
+
+    data: as in write_result.
+    """
 
     if status == "sat":
         entry = {
@@ -29,7 +114,7 @@ def write_result_json(approach_name, json_path, solve_time, status, solution_mat
             "obj": None,
             "sol": []
         }
-    else:
+    else:  # timeout / unknown
         entry = {
             "time": 300,
             "optimal": False,
@@ -37,7 +122,4 @@ def write_result_json(approach_name, json_path, solve_time, status, solution_mat
             "sol": []
         }
 
-    data[approach_name] = entry
-
-    with open(json_path, "w") as f:
-        json.dump(data, f, indent=2)
+    write_result(approach_name, json_path, entry, data=data)